@@ -10,12 +10,20 @@ Pipeline steps:
 5. Stream this record to Firehose (-> S3)
 6. Optional: backfill stream recent from MongoDB to Firehose
 7. Optional: verify Snowflake has data (if configured)
+
+Steps 4, 5 and 7 are independent of each other and run concurrently.
 """
 
 import argparse
+import asyncio
+import atexit
+import logging
+import queue
 import sys
 import time
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from typing import Optional
 
 # Add project root to path so imports work when run as script
 project_root = Path(__file__).resolve().parent.parent
@@ -32,19 +40,67 @@ if not env_file.exists() and env_example.exists():
     sys.exit(0)
 
 # Load environment variables before importing components
-try:
-    from dotenv import load_dotenv
-    load_dotenv(env_file)
-except ImportError:
-    pass  # dotenv optional; use system env vars if not installed
+from src.bootstrap import load_env_once
+load_env_once()
 
-from src.agent.toy_agent import CompanyResearcher
 from src.agent.metadata_collector import MetadataCollector
-from src.database.mongodb_client import MongoDBClient
-from src.pipeline.metadata_streamer import MetadataStreamer
 
+# SDK-backed components (tavily, pymongo, boto3, snowflake) are imported inside
+# the functions that use them, so --help and argument errors stay fast.
 
-def run_research(
+# Step progress goes through a queue so stdout writes happen on a background
+# thread. The handler is attached once at import, so importers of
+# run_research/arun_research get the same output as the CLI.
+logger = logging.getLogger("run_agent")
+_log_queue: queue.Queue = queue.Queue(-1)
+logger.addHandler(QueueHandler(_log_queue))
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_listener: Optional[QueueListener] = None
+
+
+def _start_log_listener() -> QueueListener:
+    """Start the thread writing queued step progress to stdout (no-op if already running)."""
+    global _listener
+    if _listener is None:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _listener = QueueListener(_log_queue, handler)
+        _listener.start()
+        atexit.register(_stop_log_listener)
+    return _listener
+
+
+def _stop_log_listener() -> None:
+    """Flush queued step progress and stop the writer thread (safe to call repeatedly)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        atexit.unregister(_stop_log_listener)
+
+
+def _save_to_mongo(metadata: dict) -> str:
+    """Step 4 worker: persist metadata to MongoDB and return the doc id."""
+    from src.database.mongodb_client import MongoDBClient
+    mongo_client = MongoDBClient()
+    try:
+        return mongo_client.save_metadata(metadata)
+    finally:
+        mongo_client.close()
+
+
+def _count_snowflake_runs() -> int:
+    """Step 7 worker: count recent agent_runs rows in Snowflake."""
+    from src.snowflake.snowflake_client import SnowflakeClient
+    client = SnowflakeClient()
+    try:
+        return len(client.get_agent_runs(limit=5))
+    finally:
+        client.close()
+
+
+async def arun_research(
     query: str,
     agent_version: str = "1.0.0",
     max_sources: int = 5,
@@ -54,8 +110,18 @@ def run_research(
     verify_snowflake: bool = False,
 ) -> dict:
     """
-    Execute the full pipeline with clear steps for step-by-step debugging.
+    Execute the full pipeline, overlapping the independent I/O stages.
+
+    Once metadata is collected, the MongoDB save (Step 4), Firehose stream
+    (Step 5) and Snowflake verify (Step 7) have no data dependency on each
+    other, so they run concurrently in worker threads. The backfill (Step 6)
+    reads back from MongoDB and therefore waits for Step 4. Stage outcomes are
+    reported in step order once they finish.
     """
+    from src.agent.toy_agent import CompanyResearcher
+    from src.pipeline.metadata_streamer import MetadataStreamer
+
+    _start_log_listener()
     result = {
         "state": None,
         "metadata": None,
@@ -70,86 +136,136 @@ def run_research(
     }
 
     # --- Step 1: Initialize components ---
-    print("[Step 1] Initialize agent and metadata collector")
+    logger.info("[Step 1] Initialize agent and metadata collector")
     collector = MetadataCollector(agent_version=agent_version)
     researcher = CompanyResearcher(agent_version=agent_version, max_sources=max_sources)
 
     # --- Step 2: Run research ---
-    print(f"[Step 2] Run research for: {query}")
+    logger.info(f"[Step 2] Run research for: {query}")
     start_time = time.time()
+    perf_start = time.perf_counter()
     state = researcher.research(query)
+    perf_end = time.perf_counter()
     end_time = time.time()
     result["state"] = state
 
     # --- Step 3: Collect metadata ---
-    print("[Step 3] Collect execution metadata")
+    logger.info("[Step 3] Collect execution metadata")
     metadata = collector.collect_from_research_state(
         query=query,
         state=state,
         start_time=start_time,
         end_time=end_time,
+        perf_start=perf_start,
+        perf_end=perf_end,
     )
     result["metadata"] = metadata
 
-    # --- Step 4: Save to MongoDB ---
-    print("[Step 4] Save metadata to MongoDB")
-    try:
-        mongo_client = MongoDBClient()
-        result["mongo_id"] = mongo_client.save_metadata(metadata)
-        mongo_client.close()
-        print(f"  -> Saved (doc id: {result['mongo_id']})")
-    except ValueError as e:
-        result["mongo_error"] = str(e)
-        print(f"  -> Skipped (not configured): {e}")
-    except Exception as e:
-        result["mongo_error"] = str(e)
-        print(f"  -> Failed: {e}")
+    # Steps 5 and 6 share one streamer (one Firehose client + MongoDB connection)
+    streamer: Optional[MetadataStreamer] = None
 
-    # --- Step 5: Stream this record to Firehose (-> S3) ---
-    print("[Step 5] Stream metadata to Firehose (-> S3)")
-    if stream_to_firehose and metadata:
-        try:
-            streamer = MetadataStreamer()
-            result["firehose_sent"] = streamer.stream_metadata(metadata)
-            print(f"  -> Sent: {result['firehose_sent']}")
-        except Exception as e:
-            result["firehose_error"] = str(e)
-            print(f"  -> Failed: {e}")
-    else:
-        print("  -> Skipped (--no-firehose or no metadata)")
-
-    # --- Step 6: Optional backfill - stream recent from MongoDB to Firehose ---
-    if backfill_firehose:
-        print(f"[Step 6] Backfill: stream last {backfill_limit} records from MongoDB to Firehose")
-        try:
-            streamer = MetadataStreamer()
-            result["backfill_sent"] = streamer.stream_recent(limit=backfill_limit)
-            print(f"  -> Sent: {result['backfill_sent']} records")
-        except Exception as e:
-            result["backfill_error"] = str(e)
-            print(f"  -> Failed: {e}")
-    else:
-        print("[Step 6] Backfill Firehose skipped (use --backfill-firehose to run)")
-
-    # --- Step 7: Optional - verify Snowflake (3-table model: agent_runs, run_steps, api_calls) ---
+    async def open_streamer_and_send() -> Optional[bool]:
+        nonlocal streamer
+        streamer = await asyncio.to_thread(MetadataStreamer)
+        if stream_to_firehose and metadata:
+            return await asyncio.to_thread(streamer.stream_metadata, metadata)
+        return None
+
+    # --- Steps 4, 5, 7: independent I/O, issued concurrently ---
+    # save_metadata edits its dict in place (timestamp_utc -> datetime, _id),
+    # so the Mongo stage gets its own copy while Firehose reads the original
+    tasks = {"mongo": asyncio.to_thread(_save_to_mongo, dict(metadata))}
+    if stream_to_firehose or backfill_firehose:
+        tasks["firehose"] = open_streamer_and_send()
     if verify_snowflake:
-        print("[Step 7] Verify Snowflake (query recent agent_runs)")
-        try:
-            from src.snowflake.snowflake_client import SnowflakeClient
-            client = SnowflakeClient()
-            rows = client.get_agent_runs(limit=5)
-            client.close()
-            result["snowflake_count"] = len(rows)
-            print(f"  -> Recent agent_runs in Snowflake: {len(rows)}")
-        except Exception as e:
-            result["snowflake_error"] = str(e)
-            print(f"  -> Failed (Snowflake not configured?): {e}")
-    else:
-        print("[Step 7] Snowflake verify skipped (use --verify-snowflake to run)")
+        tasks["snowflake"] = asyncio.to_thread(_count_snowflake_runs)
+    outcomes = dict(zip(tasks, await asyncio.gather(*tasks.values(), return_exceptions=True)))
+
+    try:
+        # --- Step 4: Save to MongoDB ---
+        logger.info("[Step 4] Save metadata to MongoDB")
+        outcome = outcomes["mongo"]
+        if isinstance(outcome, ValueError):
+            result["mongo_error"] = str(outcome)
+            logger.info(f"  -> Skipped (not configured): {outcome}")
+        elif isinstance(outcome, Exception):
+            result["mongo_error"] = str(outcome)
+            logger.info(f"  -> Failed: {outcome}")
+        else:
+            result["mongo_id"] = outcome
+            logger.info(f"  -> Saved (doc id: {result['mongo_id']})")
+
+        # --- Step 5: Stream this record to Firehose (-> S3) ---
+        logger.info("[Step 5] Stream metadata to Firehose (-> S3)")
+        if stream_to_firehose and metadata:
+            outcome = outcomes["firehose"]
+            if isinstance(outcome, Exception):
+                result["firehose_error"] = str(outcome)
+                logger.info(f"  -> Failed: {outcome}")
+            else:
+                result["firehose_sent"] = outcome
+                logger.info(f"  -> Sent: {result['firehose_sent']}")
+        else:
+            logger.info("  -> Skipped (--no-firehose or no metadata)")
+
+        # --- Step 6: Optional backfill - stream recent from MongoDB to Firehose ---
+        if backfill_firehose:
+            logger.info(f"[Step 6] Backfill: stream last {backfill_limit} records from MongoDB to Firehose")
+            try:
+                if streamer is None:
+                    raise outcomes["firehose"]
+                result["backfill_sent"] = await asyncio.to_thread(
+                    streamer.stream_recent, limit=backfill_limit,
+                )
+                logger.info(f"  -> Sent: {result['backfill_sent']} records")
+            except Exception as e:
+                result["backfill_error"] = str(e)
+                logger.info(f"  -> Failed: {e}")
+        else:
+            logger.info("[Step 6] Backfill Firehose skipped (use --backfill-firehose to run)")
+
+        # --- Step 7: Optional - verify Snowflake (3-table model: agent_runs, run_steps, api_calls) ---
+        if verify_snowflake:
+            logger.info("[Step 7] Verify Snowflake (query recent agent_runs)")
+            outcome = outcomes["snowflake"]
+            if isinstance(outcome, Exception):
+                result["snowflake_error"] = str(outcome)
+                logger.info(f"  -> Failed (Snowflake not configured?): {outcome}")
+            else:
+                result["snowflake_count"] = outcome
+                logger.info(f"  -> Recent agent_runs in Snowflake: {outcome}")
+        else:
+            logger.info("[Step 7] Snowflake verify skipped (use --verify-snowflake to run)")
+    finally:
+        if streamer is not None:
+            streamer.close()
 
     return result
 
 
+def run_research(
+    query: str,
+    agent_version: str = "1.0.0",
+    max_sources: int = 5,
+    stream_to_firehose: bool = True,
+    backfill_firehose: bool = False,
+    backfill_limit: int = 10,
+    verify_snowflake: bool = False,
+) -> dict:
+    """
+    Execute the full pipeline (synchronous wrapper around arun_research).
+    """
+    return asyncio.run(arun_research(
+        query=query,
+        agent_version=agent_version,
+        max_sources=max_sources,
+        stream_to_firehose=stream_to_firehose,
+        backfill_firehose=backfill_firehose,
+        backfill_limit=backfill_limit,
+        verify_snowflake=verify_snowflake,
+    ))
+
+
 def main():
     parser = argparse.ArgumentParser(description="Run Tavily company research agent")
     parser.add_argument(
@@ -192,36 +308,41 @@ def main():
     )
     args = parser.parse_args()
 
+    _start_log_listener()
     try:
-        result = run_research(
-            query=args.query,
-            agent_version=args.version,
-            max_sources=args.max_sources,
-            stream_to_firehose=not args.no_firehose,
-            backfill_firehose=args.backfill_firehose,
-            backfill_limit=args.backfill_limit,
-            verify_snowflake=args.verify_snowflake,
-        )
+        try:
+            result = run_research(
+                query=args.query,
+                agent_version=args.version,
+                max_sources=args.max_sources,
+                stream_to_firehose=not args.no_firehose,
+                backfill_firehose=args.backfill_firehose,
+                backfill_limit=args.backfill_limit,
+                verify_snowflake=args.verify_snowflake,
+            )
+        finally:
+            _stop_log_listener()
 
         # Summary
         state = result["state"]
         metadata = result["metadata"]
-        print("\n--- Summary ---")
+        lines = ["", "--- Summary ---"]
         if state.get("error"):
-            print(f"Research: FAILED ({state['error']})")
+            lines.append(f"Research: FAILED ({state['error']})")
         else:
             company = state.get("company_name") or args.query
             industry = state.get("industry") or "n/a"
             n_src = len(state.get("sources", []))
             n_steps = len(state.get("steps", []))
-            print(f"Research: OK | {company} ({industry}) | {n_src} sources | {n_steps} steps | {metadata['latency_ms']:.0f}ms")
-        print(f"MongoDB:  {result['mongo_id'] or result['mongo_error'] or 'skipped'}")
-        print(f"Firehose: {'sent' if result['firehose_sent'] else result['firehose_error'] or 'skipped'}")
+            lines.append(f"Research: OK | {company} ({industry}) | {n_src} sources | {n_steps} steps | {metadata['latency_ms']:.0f}ms")
+        lines.append(f"MongoDB:  {result['mongo_id'] or result['mongo_error'] or 'skipped'}")
+        lines.append(f"Firehose: {'sent' if result['firehose_sent'] else result['firehose_error'] or 'skipped'}")
         if result.get("backfill_sent") is not None and result["backfill_sent"] > 0:
-            print(f"Backfill: {result['backfill_sent']} records")
+            lines.append(f"Backfill: {result['backfill_sent']} records")
         if result.get("snowflake_count") is not None:
-            print(f"Snowflake: {result['snowflake_count']} recent rows")
-        print("Dashboard: streamlit run src/dashboard/app.py")
+            lines.append(f"Snowflake: {result['snowflake_count']} recent rows")
+        lines.append("Dashboard: streamlit run src/dashboard/app.py")
+        sys.stdout.write("\n".join(lines) + "\n")
 
         return 0 if not state.get("error") else 1
 
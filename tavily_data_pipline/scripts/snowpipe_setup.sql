@@ -1,7 +1,12 @@
 -- Snowpipe setup for Tavily agent pipeline
--- Run this in Snowflake (Worksheets or snowsql) after creating a database and schema.
+-- Run this in Snowflake (Worksheets or snowsql) after creating a database and schema,
+-- or in one request from Python: SnowflakeClient().execute_script(Path(...).read_text()).
 -- Replace YOUR_BUCKET, YOUR_PREFIX, YOUR_AWS_ACCOUNT, YOUR_IAM_ROLE with your values.
 -- Prerequisites: S3 bucket with Firehose delivery; IAM role with read access to the bucket.
+-- Every object is created IF NOT EXISTS, so re-running the script is safe and
+-- leaves existing pipes (and their load history) and stages alone. To change a
+-- definition, run that statement once with CREATE OR REPLACE instead. The one
+-- exception is api_calls_pipe, whose COPY gained cache_hit (see section 4).
 
 -- ---------------------------------------------------------------------------
 -- 1. Database and schema (adjust or skip if already created)
@@ -12,9 +17,13 @@
 
 -- ---------------------------------------------------------------------------
 -- 2. File format for JSON (one JSON object per line, e.g. from Firehose)
+-- COMPRESSION = AUTO reads both GZIP objects (Firehose CompressionFormat = GZIP)
+-- and uncompressed ones, including objects made of per-record gzip members or
+-- zstd frames (FIREHOSE_RECORD_COMPRESSION=gzip/zstd with CompressionFormat = UNCOMPRESSED).
 -- ---------------------------------------------------------------------------
-CREATE OR REPLACE FILE FORMAT agent_metadata_json_format
+CREATE FILE FORMAT IF NOT EXISTS agent_metadata_json_format
   TYPE = JSON
+  COMPRESSION = AUTO
   STRIP_OUTER_ARRAY = FALSE
   DATE_FORMAT = 'AUTO'
   TIMESTAMP_FORMAT = 'AUTO';
@@ -22,7 +31,7 @@ CREATE OR REPLACE FILE FORMAT agent_metadata_json_format
 -- ---------------------------------------------------------------------------
 -- 3. External stage (S3) – replace placeholders with your bucket and path
 -- ---------------------------------------------------------------------------
-CREATE OR REPLACE STAGE agent_metadata_stage
+CREATE STAGE IF NOT EXISTS agent_metadata_stage
   URL = 's3://YOUR_BUCKET/YOUR_PREFIX/'
   CREDENTIALS = (AWS_ROLE = 'arn:aws:iam::YOUR_AWS_ACCOUNT:role/YOUR_IAM_ROLE')
   FILE_FORMAT = agent_metadata_json_format;
@@ -40,7 +49,7 @@ CREATE TABLE IF NOT EXISTS agent_runs (
   started_at         TIMESTAMP_NTZ,
   completed_at       TIMESTAMP_NTZ,
   total_latency_ms   FLOAT,
-  total_api_calls    INTEGER,
+  total_api_calls    INTEGER,  -- calls that reached Tavily/OpenAI (cache hits excluded)
   error_message      VARCHAR(1000),
   ingested_at        TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
   PRIMARY KEY (run_id)
@@ -67,11 +76,32 @@ CREATE TABLE IF NOT EXISTS api_calls (
   results_returned  INTEGER,
   latency_ms        FLOAT,
   called_at         TIMESTAMP_NTZ,
+  cache_hit         BOOLEAN DEFAULT FALSE,
   ingested_at       TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
   PRIMARY KEY (call_id),
   FOREIGN KEY (run_id) REFERENCES agent_runs(run_id)
 );
 
+-- Optional, for large agent_runs tables: the dashboard filters and sorts on
+-- started_at, so clustering on it lets Snowflake prune micro-partitions.
+-- ALTER TABLE agent_runs CLUSTER BY (started_at);
+
+-- Optional (Enterprise Edition): a materialized view of the columns the
+-- dashboard reads, clustered on started_at, so its recent-runs queries scan
+-- fewer micro-partitions. Point the client at it with
+-- SNOWFLAKE_RUNS_SOURCE=agent_runs_recent_mv.
+-- CREATE MATERIALIZED VIEW IF NOT EXISTS agent_runs_recent_mv
+--   CLUSTER BY (started_at)
+--   AS SELECT run_id, company_name, industry, status, started_at, completed_at,
+--             total_latency_ms, total_api_calls, error_message, ingested_at
+--      FROM agent_runs;
+
+-- Migration for tables created before cache_hit was added. The column alone
+-- is not enough: a pipe keeps the COPY it was created with, so api_calls_pipe
+-- (section 5) is created OR REPLACE to pick up the new cache_hit mapping.
+-- Otherwise cache_hit would stay at its FALSE default on existing deployments.
+ALTER TABLE api_calls ADD COLUMN IF NOT EXISTS cache_hit BOOLEAN DEFAULT FALSE;
+
 -- ---------------------------------------------------------------------------
 -- 5. Snowpipes – auto-ingest from S3 when new files arrive
 -- Firehose writes to S3 with a prefix; you can use one prefix per table
@@ -80,7 +110,7 @@ CREATE TABLE IF NOT EXISTS api_calls (
 -- ---------------------------------------------------------------------------
 
 -- Pipe for agent_runs (expects JSON with run_id, company_name, industry, status, started_at, completed_at, total_latency_ms, total_api_calls, error_message)
-CREATE OR REPLACE PIPE agent_runs_pipe
+CREATE PIPE IF NOT EXISTS agent_runs_pipe
   AUTO_INGEST = TRUE
   AS
   COPY INTO agent_runs (run_id, company_name, industry, status, started_at, completed_at, total_latency_ms, total_api_calls, error_message)
@@ -100,7 +130,7 @@ CREATE OR REPLACE PIPE agent_runs_pipe
   FILE_FORMAT = agent_metadata_json_format;
 
 -- Pipe for run_steps
-CREATE OR REPLACE PIPE run_steps_pipe
+CREATE PIPE IF NOT EXISTS run_steps_pipe
   AUTO_INGEST = TRUE
   AS
   COPY INTO run_steps (step_id, run_id, step_name, status, latency_ms, error_message)
@@ -116,11 +146,15 @@ CREATE OR REPLACE PIPE run_steps_pipe
   )
   FILE_FORMAT = agent_metadata_json_format;
 
--- Pipe for api_calls
+-- Pipe for api_calls. OR REPLACE (not IF NOT EXISTS) so pipes created before
+-- cache_hit was added get the new COPY. Replacing resets the pipe's load
+-- history; AUTO_INGEST only loads newly notified files, so don't run
+-- ALTER PIPE ... REFRESH right after, or recent files would load twice.
+-- Switch back to IF NOT EXISTS once every deployment has the new definition.
 CREATE OR REPLACE PIPE api_calls_pipe
   AUTO_INGEST = TRUE
   AS
-  COPY INTO api_calls (call_id, run_id, query_used, results_returned, latency_ms, called_at)
+  COPY INTO api_calls (call_id, run_id, query_used, results_returned, latency_ms, called_at, cache_hit)
   FROM (
     SELECT
       $1:call_id::VARCHAR,
@@ -128,7 +162,8 @@ CREATE OR REPLACE PIPE api_calls_pipe
       $1:query_used::VARCHAR,
       $1:results_returned::INTEGER,
       $1:latency_ms::FLOAT,
-      $1:called_at::TIMESTAMP_NTZ
+      $1:called_at::TIMESTAMP_NTZ,
+      COALESCE($1:cache_hit::BOOLEAN, FALSE)
     FROM @agent_metadata_stage/calls/
   )
   FILE_FORMAT = agent_metadata_json_format;
@@ -5,15 +5,37 @@ This module provides decorators and utilities to collect execution metadata
 including event_id, timestamp, query, latency, status, and other metrics.
 """
 
+import json
+import logging
+import queue
 import uuid
 import time
 import functools
+import inspect
+import threading
+from collections import deque
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional, Callable, TypeVar, cast, List
+from typing import Deque, Dict, Any, Optional, Callable, TypeVar, cast, List
+
+from src.ids import new_id
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional speedup; stdlib json is used otherwise
+    orjson = None
+
+logger = logging.getLogger(__name__)
 
 F = TypeVar('F', bound=Callable[..., Any])
 
 
+def _dump_line(metadata: Dict[str, Any]) -> bytes:
+    """Serialize one entry as a UTF-8 JSON line."""
+    if orjson:
+        return orjson.dumps(metadata, default=str, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(metadata, default=str) + "\n").encode("utf-8")
+
+
 class MetadataCollector:
     """
     Collects execution metadata for agent operations.
@@ -32,21 +54,57 @@ class MetadataCollector:
     - error_message: Error message if execution failed
     """
     
-    def __init__(self, agent_version: str = "1.0.0", session_id: Optional[str] = None):
+    def __init__(
+        self,
+        agent_version: str = "1.0.0",
+        session_id: Optional[str] = None,
+        max_history: int = 10_000,
+        flush_path: Optional[str] = None,
+        flush_batch_size: int = 100,
+        flush_interval: float = 1.0
+    ):
         """
         Initialize metadata collector.
         
         Args:
             agent_version: Version identifier for the agent
             session_id: Optional session ID. If None, generates a new UUID.
+            max_history: Number of most recent entries kept in memory (>= 1)
+            flush_path: Optional JSON-lines file. If set, every entry is also
+                appended there by a background thread; call close() when done.
+            flush_batch_size: Max entries written per flush
+            flush_interval: Max seconds an entry waits before being flushed
+
+        Raises:
+            ValueError: If max_history is less than 1.
         """
+        if max_history < 1:
+            raise ValueError(f"max_history must be >= 1, got {max_history}")
         self.agent_version = agent_version
         self.session_id = session_id or str(uuid.uuid4())
-        self.metadata_history: List[Dict[str, Any]] = []
+        self.metadata_history: Deque[Dict[str, Any]] = deque(maxlen=max_history)
+        # session_id -> that session's entries still in metadata_history
+        self._by_session: Dict[str, Deque[Dict[str, Any]]] = {}
+        # Guards metadata_history when runs are collected from several threads
+        # (e.g. CompanyResearcher.research_batch).
+        self._lock = threading.Lock()
+
+        self.flush_path = flush_path
+        self.flush_batch_size = flush_batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional["queue.Queue[Any]"] = None
+        self._flush_thread: Optional[threading.Thread] = None
+        self._flush_error: Optional[BaseException] = None
+        if flush_path:
+            self._queue = queue.Queue()
+            self._flush_thread = threading.Thread(
+                target=self._flush_loop, name="metadata-flush", daemon=True
+            )
+            self._flush_thread.start()
     
     def generate_event_id(self) -> str:
-        """Generate a unique event ID."""
-        return str(uuid.uuid4())
+        """Generate a unique event ID (UUID4 string; see src.ids for why a PRNG is used)."""
+        return new_id()
     
     def get_current_timestamp(self) -> str:
         """Get current UTC timestamp in ISO8601 format."""
@@ -75,7 +133,23 @@ class MetadataCollector:
         Returns:
             Dictionary containing all metadata fields
         """
-        metadata = {
+        metadata = self._base_metadata(
+            query, status, latency_ms, response_size_chars, num_sources, error_message
+        )
+        self._record(metadata)
+        return metadata
+
+    def _base_metadata(
+        self,
+        query: str,
+        status: str,
+        latency_ms: float,
+        response_size_chars: int,
+        num_sources: int,
+        error_message: Optional[str]
+    ) -> Dict[str, Any]:
+        """Build the run-level metadata fields shared by every entry."""
+        return {
             "event_id": self.generate_event_id(),
             "timestamp_utc": self.get_current_timestamp(),
             "query": query,
@@ -88,16 +162,39 @@ class MetadataCollector:
             "agent_version": self.agent_version,
             "error_message": error_message
         }
-        
-        self.metadata_history.append(metadata)
-        return metadata
+
+    def _record(self, metadata: Dict[str, Any]) -> None:
+        """Store a finished entry in history and hand it to the flush thread."""
+        with self._lock:
+            self._append(metadata)
+        if self._queue is not None:
+            # The caller keeps using the returned dict (save_metadata adds
+            # _id to it), so the flush thread gets its own copy
+            self._queue.put_nowait(dict(metadata))
+
+    def _append(self, metadata: Dict[str, Any]) -> None:
+        """Append to the bounded history and session index (caller holds the lock)."""
+        history = self.metadata_history
+        if history.maxlen is not None and len(history) == history.maxlen:
+            # The oldest entry is about to be evicted; it is also the oldest
+            # entry of its session, so drop it from the index too.
+            evicted = history[0]
+            session_entries = self._by_session.get(evicted["session_id"])
+            if session_entries:
+                session_entries.popleft()
+                if not session_entries:
+                    del self._by_session[evicted["session_id"]]
+        history.append(metadata)
+        self._by_session.setdefault(metadata["session_id"], deque()).append(metadata)
     
     def collect_from_research_state(
         self,
         query: str,
         state: Dict[str, Any],
         start_time: float,
-        end_time: float
+        end_time: float,
+        perf_start: Optional[float] = None,
+        perf_end: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Collect metadata from a ResearchState result.
@@ -105,13 +202,18 @@ class MetadataCollector:
         Args:
             query: The research query string
             state: ResearchState dictionary from research() method
-            start_time: Start time from time.time()
-            end_time: End time from time.time()
+            start_time: Start time from time.time() (wall clock, for timestamps)
+            end_time: End time from time.time() (wall clock, for timestamps)
+            perf_start: Optional start from time.perf_counter(), used for latency
+            perf_end: Optional end from time.perf_counter(), used for latency
             
         Returns:
             Dictionary containing all metadata fields
         """
-        latency_ms = (end_time - start_time) * 1000
+        if perf_start is not None and perf_end is not None:
+            latency_ms = (perf_end - perf_start) * 1000
+        else:
+            latency_ms = (end_time - start_time) * 1000
         
         if state.get("error"):
             status = "failure"
@@ -121,47 +223,95 @@ class MetadataCollector:
             error_message = None
         
         sources = state.get("sources", [])
-        response_size_chars = sum(
-            len(str(source.get("title", ""))) +
-            len(str(source.get("content", ""))) +
-            len(str(source.get("url", "")))
-            for source in sources
-        )
+        response_size_chars = 0
+        for source in sources:
+            # Agent sources are already strings; only fall back to str() otherwise
+            for key in ("title", "content", "url"):
+                value = source.get(key, "")
+                response_size_chars += len(value) if isinstance(value, str) else len(str(value))
         
         num_sources = len(sources)
         
-        metadata = self.collect_metadata(
-            query=query,
-            status=status,
-            latency_ms=latency_ms,
-            response_size_chars=response_size_chars,
-            num_sources=num_sources,
-            error_message=error_message
+        metadata = self._base_metadata(
+            query, status, latency_ms, response_size_chars, num_sources, error_message
         )
 
-        metadata["company_name"] = state.get("company_name", query)
-        metadata["industry"] = state.get("industry")
-        metadata["steps"] = state.get("steps", [])
-        metadata["api_calls"] = state.get("api_calls", [])
-        metadata["started_at_utc"] = datetime.fromtimestamp(
-            start_time, tz=timezone.utc
-        ).isoformat()
-        metadata["completed_at_utc"] = datetime.fromtimestamp(
-            end_time, tz=timezone.utc
-        ).isoformat()
+        metadata.update(
+            company_name=state.get("company_name", query),
+            industry=state.get("industry"),
+            # Slotted StepResult / ApiCallResult objects become plain dicts here,
+            # the point where the entry is stored and serialized
+            steps=[step.to_dict() for step in state.get("steps", [])],
+            api_calls=[call.to_dict() for call in state.get("api_calls", [])],
+            started_at_utc=datetime.fromtimestamp(start_time, tz=timezone.utc).isoformat(),
+            completed_at_utc=datetime.fromtimestamp(end_time, tz=timezone.utc).isoformat(),
+        )
 
+        # Record only once complete so the flush thread never sees a partial entry
+        self._record(metadata)
         return metadata
     
+    def _flush_loop(self) -> None:
+        """Drain the queue and append entries to flush_path in batches."""
+        assert self._queue is not None
+        stop = False
+        while not stop:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            item = first
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.flush_batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    with open(self.flush_path, "ab") as f:
+                        f.writelines(_dump_line(m) for m in batch)
+                except Exception as e:
+                    # Any failure only loses this batch: the thread keeps
+                    # draining so producers never block, and close() raises
+                    # the first error
+                    logger.exception(
+                        "Failed to write %d metadata entries to %s", len(batch), self.flush_path
+                    )
+                    if self._flush_error is None:
+                        self._flush_error = e
+
+    def close(self) -> None:
+        """
+        Flush queued entries and stop the background writer (no-op without flush_path).
+
+        Raises:
+            RuntimeError: If writing any batch to flush_path failed.
+        """
+        if self._flush_thread is None or self._queue is None:
+            return
+        self._queue.put(None)
+        self._flush_thread.join()
+        self._flush_thread = None
+        if self._flush_error is not None:
+            raise RuntimeError(
+                f"Failed to write metadata to {self.flush_path}: {self._flush_error}"
+            ) from self._flush_error
+
     def get_latest_metadata(self) -> Optional[Dict[str, Any]]:
         """Get the most recent metadata entry."""
         return self.metadata_history[-1] if self.metadata_history else None
     
     def get_metadata_by_session(self) -> List[Dict[str, Any]]:
         """Get all metadata entries for the current session."""
-        return [
-            metadata for metadata in self.metadata_history
-            if metadata.get("session_id") == self.session_id
-        ]
+        with self._lock:
+            return list(self._by_session.get(self.session_id, ()))
 
 
 def track_execution(collector: MetadataCollector):
@@ -183,53 +333,57 @@ def track_execution(collector: MetadataCollector):
         Decorator function
     """
     def decorator(func: F) -> F:
+        # Resolve where "query" sits positionally once, not on every call.
+        # Without a "query" parameter, fall back to the first argument after self.
+        params = list(inspect.signature(func).parameters)
+        query_idx = params.index("query") if "query" in params else 1
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             # Extract query from args or kwargs
-            query = kwargs.get("query") or (args[1] if len(args) > 1 else "")
+            if "query" in kwargs:
+                query = kwargs["query"]
+            else:
+                query = args[query_idx] if len(args) > query_idx else ""
             
             start_time = time.time()
-            error_message = None
-            
+            perf_start = time.perf_counter()
+
             try:
                 result = func(*args, **kwargs)
-                end_time = time.time()
-                
-                # If result is a ResearchState, extract metadata from it
-                if isinstance(result, dict) and "sources" in result:
-                    metadata = collector.collect_from_research_state(
-                        query=query,
-                        state=result,
-                        start_time=start_time,
-                        end_time=end_time
-                    )
-                else:
-                    # Generic metadata collection
-                    latency_ms = (end_time - start_time) * 1000
-                    response_size_chars = len(str(result)) if result else 0
-                    
-                    metadata = collector.collect_metadata(
-                        query=query,
-                        status="success",
-                        latency_ms=latency_ms,
-                        response_size_chars=response_size_chars
-                    )
-                
-                return result
-                
             except Exception as e:
-                end_time = time.time()
-                error_message = str(e)
-                latency_ms = (end_time - start_time) * 1000
-                
                 collector.collect_metadata(
                     query=query,
                     status="failure",
-                    latency_ms=latency_ms,
-                    error_message=error_message
+                    latency_ms=(time.perf_counter() - perf_start) * 1000,
+                    error_message=str(e)
                 )
-                
                 raise
+
+            perf_end = time.perf_counter()
+            end_time = time.time()
+
+            # Collection happens outside the try so a collector error is not
+            # recorded as a second, failed execution.
+            if isinstance(result, dict) and "sources" in result:
+                # ResearchState: one complete entry with steps and API calls
+                collector.collect_from_research_state(
+                    query=query,
+                    state=result,
+                    start_time=start_time,
+                    end_time=end_time,
+                    perf_start=perf_start,
+                    perf_end=perf_end
+                )
+            else:
+                collector.collect_metadata(
+                    query=query,
+                    status="success",
+                    latency_ms=(perf_end - perf_start) * 1000,
+                    response_size_chars=len(str(result)) if result else 0
+                )
+
+            return result
         
         return cast(F, wrapper)
     return decorator
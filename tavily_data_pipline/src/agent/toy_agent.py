@@ -6,28 +6,64 @@ Three-step research: overview search, competitor search, and OpenAI summarizatio
 
 import json
 import os
+import threading
 import time
-from typing import TypedDict, List, Dict, Any, Optional
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TypedDict, List, Dict, Any, Hashable, Iterable, Optional, Set, Tuple
 from datetime import datetime, timezone
 
 from tavily import TavilyClient  # type: ignore
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional speedup; stdlib json is used otherwise
+    orjson = None
 
-class StepResult(TypedDict):
+
+# Step and API-call records are slotted (no per-instance __dict__) since a
+# batch creates several per query. They stay objects in ResearchState and are
+# converted with to_dict() only when MetadataCollector builds the stored
+# document; record["field"] reads still work for dict-style callers.
+
+@dataclass
+class StepResult:
     """Result of a single research step."""
+    __slots__ = ("step_name", "status", "latency_ms", "error")
     step_name: str
     status: str
     latency_ms: float
     error: Optional[str]
 
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
 
-class ApiCallResult(TypedDict):
+@dataclass
+class ApiCallResult:
     """Result of a single external API call."""
+    __slots__ = ("provider", "query", "results_returned", "latency_ms", "called_at", "cache_hit")
     provider: str
     query: str
     results_returned: int
     latency_ms: float
     called_at: str
+    cache_hit: bool
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
 
 
 class ResearchState(TypedDict):
@@ -43,6 +79,123 @@ class ResearchState(TypedDict):
     error: Optional[str]
 
 
+@dataclass
+class SourceBatch:
+    """
+    Search sources stored column-wise: one list per field instead of one
+    dict per source. Converted to ResearchState's list of dicts via
+    to_dicts() once research finishes.
+    """
+    titles: List[str] = field(default_factory=list)
+    urls: List[str] = field(default_factory=list)
+    contents: List[str] = field(default_factory=list)
+    scores: "array[float]" = field(default_factory=lambda: array("d"))
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict[str, Any]]) -> "SourceBatch":
+        """Build a batch from raw Tavily results, defaulting missing fields."""
+        batch = cls()
+        for r in results:
+            batch.titles.append(r.get("title") or "")
+            batch.urls.append(r.get("url") or "")
+            batch.contents.append(r.get("content") or "")
+            batch.scores.append(float(r.get("score") or 0.0))
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def extend_unique(self, other: "SourceBatch", seen_urls: Set[str]) -> None:
+        """Append sources from other whose URL is not in seen_urls (empty URLs always kept)."""
+        for title, url, content, score in zip(
+            other.titles, other.urls, other.contents, other.scores
+        ):
+            if url:
+                if url in seen_urls:
+                    continue
+                seen_urls.add(url)
+            self.titles.append(title)
+            self.urls.append(url)
+            self.contents.append(content)
+            self.scores.append(score)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Row-wise view: [{"title", "url", "content", "score"}, ...]."""
+        return [
+            {"title": t, "url": u, "content": c, "score": sc}
+            for t, u, c, sc in zip(self.titles, self.urls, self.contents, self.scores)
+        ]
+
+
+# Caps on source text sent to OpenAI (per source, and for all sources combined)
+MAX_SOURCE_CONTENT_CHARS = 500
+MAX_PROMPT_SOURCES_CHARS = 6000
+
+_SUMMARIZE_PROMPT = (
+    'Given this research about "{query}":\n\n{combined}\n\n'
+    "Return a JSON object with these fields:\n"
+    '{{"company_name": "<official company name>", '
+    '"industry": "<single label, e.g. SaaS, Fintech, Semiconductors, '
+    'AI/ML, Healthcare, E-commerce>", '
+    '"summary": "<2-3 sentence summary>"}}'
+)
+
+
+class _LRUCache:
+    """Small thread-safe LRU map; maxsize 0 disables caching."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value (marking it recent), or None on a miss."""
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+# (sources, step, api_call, fatal) returned by a single Tavily search step;
+# fatal is True when the failure was a TavilyAuthError
+_SearchResult = Tuple[SourceBatch, StepResult, ApiCallResult, bool]
+
+# Tavily SDK errors (by class name) and HTTP statuses that retrying cannot fix:
+# bad/missing key, forbidden, plan usage limit exceeded
+_PERMANENT_TAVILY_ERRORS = (
+    "InvalidAPIKeyError", "MissingAPIKeyError", "ForbiddenError", "UsageLimitExceededError",
+)
+_PERMANENT_TAVILY_STATUSES = (401, 403, 432, 433)
+
+
+class TavilyAuthError(RuntimeError):
+    """Tavily rejected the key or quota; every further call will fail the same way."""
+
+
+class TavilyTransientError(RuntimeError):
+    """Tavily call failed in a way that may succeed later (network, 5xx, rate limit)."""
+
+
+def _is_permanent_tavily_error(e: Exception) -> bool:
+    if type(e).__name__ in _PERMANENT_TAVILY_ERRORS:
+        return True
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+    return status in _PERMANENT_TAVILY_STATUSES
+
+
 class TavilySearchTool:
     """Wrapper for Tavily search API."""
 
@@ -53,6 +206,13 @@ class TavilySearchTool:
         self.client = TavilyClient(api_key=self.api_key)
 
     def search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        """
+        Run an advanced Tavily search.
+
+        Raises:
+            TavilyAuthError: Invalid key, forbidden, or usage limit exceeded.
+            TavilyTransientError: Any other failure.
+        """
         try:
             response = self.client.search(
                 query=query,
@@ -61,7 +221,9 @@ class TavilySearchTool:
             )
             return response.get("results", [])
         except Exception as e:
-            raise RuntimeError(f"Tavily search failed: {str(e)}") from e
+            if _is_permanent_tavily_error(e):
+                raise TavilyAuthError(f"Tavily search failed: {str(e)}") from e
+            raise TavilyTransientError(f"Tavily search failed: {str(e)}") from e
 
 
 class CompanyResearcher:
@@ -77,12 +239,18 @@ class CompanyResearcher:
         openai_api_key: Optional[str] = None,
         agent_version: str = "1.0.0",
         max_sources: int = 5,
+        cache_size: int = 256,
     ):
         self.tavily_tool = TavilySearchTool(api_key=tavily_api_key)
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
         self.agent_version = agent_version
         self.max_sources = max_sources
 
+        # In-process response caches (successful calls only); repeated
+        # queries in a batch skip the network. cache_size=0 disables them.
+        self._search_cache = _LRUCache(cache_size)
+        self._summary_cache = _LRUCache(cache_size)
+
         self.openai_client = None
         if self.openai_api_key:
             try:
@@ -96,106 +264,123 @@ class CompanyResearcher:
     # ------------------------------------------------------------------
 
     def _tavily_step(
-        self, step_name: str, query: str, state: ResearchState,
-    ) -> List[Dict[str, Any]]:
-        """Run a single Tavily search and record the step + API call."""
-        t0 = time.time()
-        error = None
-        formatted: List[Dict[str, Any]] = []
-        try:
-            raw = self.tavily_tool.search(query, max_results=self.max_sources)
-            formatted = [
-                {
-                    "title": s.get("title", ""),
-                    "url": s.get("url", ""),
-                    "content": s.get("content", ""),
-                    "score": s.get("score", 0.0),
-                }
-                for s in raw
-            ]
-        except Exception as e:
-            error = str(e)
+        self, step_name: str, query: str,
+    ) -> _SearchResult:
+        """
+        Run a single Tavily search.
 
-        latency = (time.time() - t0) * 1000
-        state["steps"].append({
-            "step_name": step_name,
-            "status": "failure" if error else "success",
-            "latency_ms": latency,
-            "error": error,
-        })
-        state["api_calls"].append({
-            "provider": "tavily",
-            "query": query,
-            "results_returned": len(formatted),
-            "latency_ms": latency,
-            "called_at": datetime.now(timezone.utc).isoformat(),
-        })
-        return formatted
+        Does not touch the research state, so searches can run in parallel;
+        returns (sources, step, api_call, fatal) for the caller to record.
+        """
+        called_at = time.time()
+        t0 = time.perf_counter()
+        error = None
+        fatal = False
+        cache_key = (query, self.max_sources)
+        cached = self._search_cache.get(cache_key)
+        sources = cached if cached is not None else SourceBatch()
+        if cached is None:
+            try:
+                raw = self.tavily_tool.search(query, max_results=self.max_sources)
+                sources = SourceBatch.from_results(raw)
+                self._search_cache.put(cache_key, sources)
+            except TavilyAuthError as e:
+                error = str(e)
+                fatal = True
+            except Exception as e:
+                error = str(e)
+
+        latency = (time.perf_counter() - t0) * 1000
+        step = StepResult(
+            step_name=step_name,
+            status="failure" if error else "success",
+            latency_ms=latency,
+            error=error,
+        )
+        api_call = ApiCallResult(
+            provider="tavily",
+            query=query,
+            results_returned=len(sources),
+            latency_ms=latency,
+            called_at=datetime.fromtimestamp(called_at, tz=timezone.utc).isoformat(),
+            cache_hit=cached is not None,
+        )
+        return sources, step, api_call, fatal
 
     def _summarize_step(
-        self, query: str, sources: List[Dict[str, Any]], state: ResearchState,
+        self,
+        query: str,
+        sources: SourceBatch,
+        state: ResearchState,
+        steps: List[StepResult],
+        api_calls: List[ApiCallResult],
     ) -> None:
         """Use OpenAI to extract company_name, industry, and a brief summary."""
         if not self.openai_client:
-            state["steps"].append({
-                "step_name": "summarize",
-                "status": "skipped",
-                "latency_ms": 0.0,
-                "error": None,
-            })
+            steps.append(StepResult(
+                step_name="summarize",
+                status="skipped",
+                latency_ms=0.0,
+                error=None,
+            ))
             state["company_name"] = query
             return
 
+        # The summary is 2-3 sentences; a short excerpt per source is enough
         combined = "\n\n".join(
-            f"[{s['title']}] ({s['url']})\n{s['content']}"
-            for s in sources[:10]
-        )
-        prompt = (
-            f'Given this research about "{query}":\n\n{combined}\n\n'
-            "Extract the following as JSON (no markdown fences, just raw JSON):\n"
-            '{"company_name": "<official company name>", '
-            '"industry": "<single label, e.g. SaaS, Fintech, Semiconductors, '
-            'AI/ML, Healthcare, E-commerce>", '
-            '"summary": "<2-3 sentence summary>"}'
-        )
+            f"[{title}] ({url})\n{content[:MAX_SOURCE_CONTENT_CHARS]}"
+            for title, url, content in zip(
+                sources.titles[:10], sources.urls[:10], sources.contents[:10]
+            )
+        )[:MAX_PROMPT_SOURCES_CHARS]
+        prompt = _SUMMARIZE_PROMPT.format(query=query, combined=combined)
 
-        t0 = time.time()
+        called_at = time.time()
+        t0 = time.perf_counter()
         error = None
+        # temperature=0, so the same prompt yields the same extraction
+        parsed = self._summary_cache.get(prompt)
+        cache_hit = parsed is not None
         try:
-            resp = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                max_tokens=300,
-            )
-            text = resp.choices[0].message.content.strip()
-            if text.startswith("```"):
-                text = text.split("```")[1]
-                if text.startswith("json"):
-                    text = text[4:]
-                text = text.strip()
-            parsed = json.loads(text)
+            if parsed is None:
+                resp = self.openai_client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0,
+                    max_tokens=300,
+                    # JSON mode: the reply is a bare JSON object, never fenced
+                    response_format={"type": "json_object"},
+                )
+                text = resp.choices[0].message.content
+                parsed = orjson.loads(text) if orjson else json.loads(text)
+                if not isinstance(parsed, dict):
+                    raise ValueError(f"OpenAI reply is not a JSON object: {text[:200]!r}")
             state["company_name"] = parsed.get("company_name", query)
             state["industry"] = parsed.get("industry")
             state["summary"] = parsed.get("summary")
+            if not cache_hit:
+                # Cached only once the fields were extracted, so a bad reply
+                # is retried next time instead of being served from the cache
+                self._summary_cache.put(prompt, parsed)
         except Exception as e:
             error = str(e)
             state["company_name"] = query
 
-        latency = (time.time() - t0) * 1000
-        state["steps"].append({
-            "step_name": "summarize",
-            "status": "failure" if error else "success",
-            "latency_ms": latency,
-            "error": error,
-        })
-        state["api_calls"].append({
-            "provider": "openai",
-            "query": f"summarize: {query}",
-            "results_returned": 0 if error else 1,
-            "latency_ms": latency,
-            "called_at": datetime.now(timezone.utc).isoformat(),
-        })
+        latency = (time.perf_counter() - t0) * 1000
+        steps.append(StepResult(
+            step_name="summarize",
+            status="failure" if error else "success",
+            latency_ms=latency,
+            error=error,
+        ))
+        api_calls.append(ApiCallResult(
+            provider="openai",
+            query=f"summarize: {query}",
+            results_returned=0 if error else 1,
+            latency_ms=latency,
+            called_at=datetime.fromtimestamp(called_at, tz=timezone.utc).isoformat(),
+            cache_hit=cache_hit,
+        ))
 
     # ------------------------------------------------------------------
     # Public interface
@@ -208,9 +393,83 @@ class CompanyResearcher:
         2. search_competitors — Tavily search for competitors and market
         3. summarize — OpenAI extracts company_name, industry, and summary
 
+        Steps 1 and 2 are independent and run concurrently; step 3 waits for
+        both. Steps are recorded in the order above regardless of which
+        search finishes first.
+
         If OpenAI is not configured, step 3 is skipped (company_name = raw
-        query, industry = null).
+        query, industry = null). If a search fails with TavilyAuthError, the
+        remaining steps are skipped and state["error"] is set.
+        """
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            searches = self._submit_searches(executor, query)
+            return self._complete(query, searches)
+        finally:
+            # Don't wait on a search abandoned after an auth/quota failure
+            executor.shutdown(wait=False)
+
+    def research_batch(
+        self,
+        queries: List[str],
+        max_concurrency: int = 8,
+        max_summarize_concurrency: int = 4,
+    ) -> List[ResearchState]:
         """
+        Research several queries as a two-stage pipeline.
+
+        Tavily searches and OpenAI summarization run on separate thread
+        pools, so query N can be summarized while the searches for later
+        queries are already in flight. All workers share this instance's
+        Tavily and OpenAI clients (and their connection pools).
+
+        Args:
+            queries: Research queries.
+            max_concurrency: Maximum number of queries searched at once
+                (each query issues two Tavily calls).
+            max_summarize_concurrency: Maximum concurrent OpenAI calls.
+
+        Returns:
+            One ResearchState per query, in input order.
+        """
+        if not queries:
+            return []
+        search_workers = max(1, min(max_concurrency, len(queries))) * 2
+        summarize_workers = max(1, min(max_summarize_concurrency, len(queries)))
+        with ThreadPoolExecutor(max_workers=search_workers) as search_pool, \
+                ThreadPoolExecutor(max_workers=summarize_workers) as summarize_pool:
+            # Searches are queued ahead of the summarize tasks that wait on them,
+            # so the search pool keeps working through later queries meanwhile.
+            pending = [
+                summarize_pool.submit(
+                    self._complete, query, self._submit_searches(search_pool, query)
+                )
+                for query in queries
+            ]
+            return [future.result() for future in pending]
+
+    def _submit_searches(
+        self, executor: ThreadPoolExecutor, query: str,
+    ) -> List["Future[_SearchResult]"]:
+        """Submit the overview and competitor searches for a query."""
+        return [
+            executor.submit(
+                self._tavily_step,
+                "search_overview", f"{query} company overview",
+            ),
+            executor.submit(
+                self._tavily_step,
+                "search_competitors",
+                f"{query} competitors market landscape",
+            ),
+        ]
+
+    def _complete(
+        self,
+        query: str,
+        searches: List["Future[_SearchResult]"],
+    ) -> ResearchState:
+        """Collect both searches in order (deduplicated by URL), then summarize."""
         state: ResearchState = {
             "query": query,
             "company_name": None,
@@ -222,25 +481,33 @@ class CompanyResearcher:
             "research_complete": False,
             "error": None,
         }
+        steps = state["steps"]
+        api_calls = state["api_calls"]
 
         try:
-            overview = self._tavily_step(
-                "search_overview", f"{query} company overview", state,
-            )
-            competitors = self._tavily_step(
-                "search_competitors",
-                f"{query} competitors market landscape",
-                state,
-            )
-
-            state["sources"] = overview + competitors
-
-            self._summarize_step(query, state["sources"], state)
+            merged = SourceBatch()
+            seen_urls: Set[str] = set()
+            for i, future in enumerate(searches):
+                sources, step, api_call, fatal = future.result()
+                # The two searches often return the same pages (homepage,
+                # wiki, ...); keep the first copy so the prompt has no repeats.
+                merged.extend_unique(sources, seen_urls)
+                steps.append(step)
+                api_calls.append(api_call)
+                if fatal:
+                    # Bad key or exhausted quota: the remaining search and the
+                    # summarize step would fail the same way, so stop here.
+                    for pending in searches[i + 1:]:
+                        pending.cancel()
+                    raise TavilyAuthError(step.error)
+            state["sources"] = merged.to_dicts()
+
+            self._summarize_step(query, merged, state, steps, api_calls)
 
             has_sources = any(
-                s["status"] == "success"
-                for s in state["steps"]
-                if s["step_name"].startswith("search_")
+                s.status == "success"
+                for s in steps
+                if s.step_name.startswith("search_")
             )
             state["research_complete"] = has_sources
 
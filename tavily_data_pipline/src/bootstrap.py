@@ -0,0 +1,27 @@
+"""
+Environment bootstrap shared by the entrypoints (run_agent.py, dashboard).
+
+Loads the project's .env once per process. Streamlit re-executes the
+dashboard script on every rerun, but this module stays cached in
+sys.modules, so the file is only parsed the first time.
+"""
+
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+ENV_FILE = PROJECT_ROOT / ".env"
+
+_LOADED = False
+
+
+def load_env_once() -> None:
+    """Load .env into os.environ on the first call; later calls are no-ops."""
+    global _LOADED
+    if _LOADED:
+        return
+    _LOADED = True
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(ENV_FILE)
+    except ImportError:
+        pass  # dotenv optional; use system env vars if not installed
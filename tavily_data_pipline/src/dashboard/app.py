@@ -6,21 +6,21 @@ Four sections: Agent Health, Agent Performance, Usage & Demand, Cost Efficiency.
 """
 
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import date, timedelta
-from typing import Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 project_root = Path(__file__).resolve().parent.parent.parent
-sys.path.insert(0, str(project_root))
+if str(project_root) not in sys.path:  # Streamlit re-executes this script on every rerun
+    sys.path.insert(0, str(project_root))
 
-try:
-    from dotenv import load_dotenv
-    load_dotenv(project_root / ".env")
-except ImportError:
-    pass
+from src.bootstrap import load_env_once
+load_env_once()
 
 import os
 import streamlit as st
+import numpy as np
 import pandas as pd
 import altair as alt
 
@@ -69,41 +69,134 @@ st.title("Agent Pipeline Dashboard")
 st.caption("Tavily company research — health, performance, usage, cost")
 
 
+def _lower(df: pd.DataFrame) -> pd.DataFrame:
+    """Lower-case the (upper-case Snowflake) column names of a fetched frame in place."""
+    df.columns = df.columns.str.lower()
+    return df
+
+
+def _downcast(df: pd.DataFrame, columns: Tuple[Tuple[str, str], ...]) -> None:
+    """Coerce (column, downcast) pairs to the smallest numeric dtype, in place."""
+    for col, downcast in columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce", downcast=downcast)
+
+
+def _categorize(df: pd.DataFrame, columns: Tuple[str, ...]) -> None:
+    """Convert the given label columns to categoricals, in place."""
+    for col in columns:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
+
+@st.cache_resource(show_spinner=False)
+def _snowflake_client():
+    """
+    One SnowflakeClient for the whole Streamlit process.
+
+    Logging in costs a TLS handshake plus authentication, so it is paid once
+    per pooled connection and shared by every rerun and session instead of
+    once per query batch; concurrent queries each check out their own.
+    """
+    from src.snowflake.snowflake_client import SnowflakeClient
+    client = SnowflakeClient()
+    client.connect()
+    return client
+
+
+# max_entries bounds memory when many filter combinations are tried
+@st.cache_data(ttl=300, max_entries=32, show_spinner="Loading from Snowflake…")
+def _fetch_snowflake(
+    date_from: Optional[str],
+    date_to: Optional[str],
+    limit: int,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Query Snowflake for the dashboard; cached per (date_from, date_to, limit) for 5 minutes.
+
+    Returns frames keyed by name: the raw "runs" table and the server-side
+    aggregates "summary" (one row of KPI counters), "hourly" (runs per hour),
+    "companies" (runs, failures, avg latency for the top companies), "industries" (runs
+    per industry) and "step_stats" (failures, avg latency per step), all
+    covering the same runs. Step and call rows are only needed by the raw-data
+    viewer and are loaded on demand by _fetch_steps_and_calls.
+    """
+    client = _snowflake_client()
+    # The aggregates only depend on the filters, so they run on their own
+    # pooled connections while the runs are fetched here.
+    # Every result comes back as an Arrow-backed DataFrame (no row dicts).
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        summary = pool.submit(client.get_run_summary, limit, date_from, date_to, as_frame=True)
+        hourly = pool.submit(client.get_hourly_run_counts, limit, date_from, date_to, as_frame=True)
+        # Company charts show the top 10 by runs, failures or latency
+        companies = pool.submit(client.get_company_stats, limit, date_from, date_to, as_frame=True, top_n=10)
+        industries = pool.submit(client.get_industry_counts, limit, date_from, date_to, as_frame=True)
+        step_stats = pool.submit(client.get_step_stats, limit, date_from, date_to, as_frame=True)
+        runs = client.get_agent_runs(limit=limit, date_from=date_from, date_to=date_to, as_frame=True)
+        if runs.empty:
+            return {}
+        frames = {
+            "runs": _lower(runs),
+            "summary": _lower(summary.result()),
+            "hourly": _lower(hourly.result()),
+            "companies": _lower(companies.result()),
+            "industries": _lower(industries.result()),
+            "step_stats": _lower(step_stats.result()),
+        }
+    df_runs = frames["runs"]
+    if "started_at" in df_runs.columns:
+        df_runs["started_at"] = pd.to_datetime(df_runs["started_at"], utc=True)
+    if "completed_at" in df_runs.columns:
+        df_runs["completed_at"] = pd.to_datetime(df_runs["completed_at"], utc=True)
+    # Numeric dtypes up front (NULLs become NaN) so reductions take NumPy's fast path;
+    # latencies as float32 and counts as the smallest unsigned int halve the bytes moved
+    _downcast(df_runs, (("total_latency_ms", "float"), ("total_api_calls", "unsigned")))
+    # Low-cardinality labels as categoricals: groupby/compare on small int codes
+    _categorize(df_runs, ("status", "company_name", "industry"))
+    if "hour" in frames["hourly"].columns:
+        frames["hourly"]["hour"] = pd.to_datetime(frames["hourly"]["hour"], utc=True)
+    return frames
+
+
+@st.cache_data(ttl=300, max_entries=32, show_spinner="Loading steps and API calls…")
+def _fetch_steps_and_calls(
+    date_from: Optional[str],
+    date_to: Optional[str],
+    limit: int,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    run_steps and api_calls rows for the runs _fetch_snowflake loaded with the
+    same filters; cached like it, but only queried when the raw-data viewer
+    shows one of these tables.
+    """
+    runs = _fetch_snowflake(date_from, date_to, limit).get("runs")
+    if runs is None or runs.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    steps, calls = _snowflake_client().get_steps_and_calls(runs["run_id"].tolist(), limit=5000, as_frame=True)
+    df_steps, df_calls = _lower(steps), _lower(calls)
+    if "called_at" in df_calls.columns and not df_calls.empty:
+        df_calls["called_at"] = pd.to_datetime(df_calls["called_at"], utc=True)
+    _downcast(df_steps, (("latency_ms", "float"),))
+    _downcast(df_calls, (("latency_ms", "float"), ("results_returned", "unsigned")))
+    _categorize(df_steps, ("step_name", "status"))
+    _categorize(df_calls, ("query_used",))  # long strings repeated across runs
+    return df_steps, df_calls
+
+
 def load_snowflake(
-    date_from: Optional[date],
-    date_to: Optional[date],
+    date_from: Optional[str],
+    date_to: Optional[str],
     limit: int,
-) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame], Optional[pd.DataFrame], str]:
-    """Load agent_runs, run_steps, api_calls from Snowflake."""
+) -> Tuple[Optional[Dict[str, pd.DataFrame]], str]:
+    """Load dashboard frames from Snowflake (cached; errors are not cached)."""
     try:
-        from src.snowflake.snowflake_client import SnowflakeClient
-        client = SnowflakeClient()
-        date_from_str = date_from.isoformat() if date_from else None
-        date_to_str = date_to.isoformat() if date_to else None
-        runs = client.get_agent_runs(limit=limit, date_from=date_from_str, date_to=date_to_str)
-        client.close()
-        if not runs:
-            return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), ""
-        run_ids = [r["RUN_ID"] for r in runs]
-        client2 = SnowflakeClient()
-        steps = client2.get_run_steps(limit=5000, run_ids=run_ids)
-        calls = client2.get_api_calls(limit=5000, run_ids=run_ids)
-        client2.close()
-        df_runs = pd.DataFrame(runs)
-        df_steps = pd.DataFrame(steps) if steps else pd.DataFrame()
-        df_calls = pd.DataFrame(calls) if calls else pd.DataFrame()
-        for df in (df_runs, df_steps, df_calls):
-            if not df.empty:
-                df.columns = [c.lower() for c in df.columns]
-        if "started_at" in df_runs.columns:
-            df_runs["started_at"] = pd.to_datetime(df_runs["started_at"], utc=True)
-        if "completed_at" in df_runs.columns:
-            df_runs["completed_at"] = pd.to_datetime(df_runs["completed_at"], utc=True)
-        if "called_at" in df_calls.columns and not df_calls.empty:
-            df_calls["called_at"] = pd.to_datetime(df_calls["called_at"], utc=True)
-        return df_runs, df_steps, df_calls, ""
+        frames = _fetch_snowflake(date_from, date_to, limit)
+        return frames, ""
     except Exception as e:
-        return None, None, None, str(e)
+        # Rebuild the client so the next run re-reads its settings (e.g. after
+        # credentials changed); failed connections already left the pool
+        _snowflake_client.clear()
+        return None, str(e)
 
 
 # ----- Sidebar -----
@@ -123,15 +216,25 @@ if time_mode == "range":
         st.sidebar.warning("From date must be before To date.")
 limit = st.sidebar.slider("Max runs", 5, 1000, 100, help="Max agent runs to load")
 
-df_runs, df_steps, df_calls = None, None, None
 use_snowflake = False
-snowflake_error = ""
 
-df_runs, df_steps, df_calls, snowflake_error = load_snowflake(
-    date_from_filter if time_mode == "range" else None,
-    date_to_filter if time_mode == "range" else None,
+# ISO strings keep the cache keys simple and stable across reruns
+fetch_key: Tuple[Optional[str], Optional[str], int] = (
+    date_from_filter.isoformat() if time_mode == "range" and date_from_filter else None,
+    date_to_filter.isoformat() if time_mode == "range" and date_to_filter else None,
     limit,
 )
+frames, snowflake_error = load_snowflake(*fetch_key)
+frames = frames or {}
+df_runs = frames.get("runs")
+empty = pd.DataFrame()
+df_hourly = frames.get("hourly", empty)
+df_companies = frames.get("companies", empty)
+df_industries = frames.get("industries", empty)
+df_step_stats = frames.get("step_stats", empty)
+# KPI counters computed in Snowflake (one row)
+df_summary = frames.get("summary", empty)
+summary: Dict[str, Any] = df_summary.iloc[0].to_dict() if not df_summary.empty else {}
 
 if df_runs is None or df_runs.empty:
     st.error("No data from Snowflake. Check credentials (SNOWFLAKE_* in .env) and that agent_runs has data.")
@@ -148,161 +251,246 @@ schema = os.getenv("SNOWFLAKE_SCHEMA", "?")
 st.sidebar.caption(f"Source: **{db}.{schema}.agent_runs** · {len(df_runs)} rows")
 st.sidebar.metric("Runs loaded", len(df_runs))
 if st.sidebar.button("Refresh"):
+    _fetch_snowflake.clear()
+    _fetch_steps_and_calls.clear()
     st.rerun()
 
+# ----- Chart specs -----
+# Each builder is cached on its small, pre-aggregated input, so reruns with the
+# same data skip Altair's spec assembly and schema validation (to_dict) and
+# hand Streamlit the finished Vega-Lite dict.
+@st.cache_data(max_entries=64, show_spinner=False)
+def _hbar_spec(
+    df: pd.DataFrame,
+    value: str,
+    label: str,
+    color: str,
+    title: str,
+    height: int,
+    x_title: str,
+    y_title: str,
+    axis_format: Optional[str] = None,
+    tooltip_format: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Horizontal bar chart of `value` per `label`, longest bar first."""
+    axis = alt.Axis(format=axis_format, tickMinStep=1) if axis_format else alt.Undefined
+    value_tooltip = alt.Tooltip(f"{value}:Q", format=tooltip_format, title=x_title) if tooltip_format else value
+    return alt.Chart(df).mark_bar(color=color).encode(
+        x=alt.X(f"{value}:Q", title=x_title, axis=axis),
+        y=alt.Y(f"{label}:N", sort="-x", title=y_title),
+        tooltip=[label, value_tooltip],
+    ).properties(height=height, title=title).to_dict()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _latency_hist_spec(lat_hist: pd.DataFrame) -> Dict[str, Any]:
+    """Pre-binned run latency histogram (bin_start, bin_end, runs)."""
+    return alt.Chart(lat_hist).mark_bar(color=COLORS["perf"][0]).encode(
+        x=alt.X("bin_start:Q", title="Run latency (ms)"),
+        x2="bin_end:Q",
+        y=alt.Y("runs:Q", title="Number of runs"),
+        tooltip=[
+            alt.Tooltip("bin_start:Q", format=".0f", title="From (ms)"),
+            alt.Tooltip("bin_end:Q", format=".0f", title="To (ms)"),
+            alt.Tooltip("runs:Q", title="Runs"),
+        ],
+    ).properties(height=240, title="Run latency distribution").to_dict()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _industry_pie_spec(df_industries: pd.DataFrame) -> Dict[str, Any]:
+    """Donut chart of runs per industry."""
+    return alt.Chart(df_industries).mark_arc(innerRadius=40).encode(
+        theta=alt.Theta("runs:Q"),
+        color=alt.Color("industry:N", scale=alt.Scale(range=CHART_COLORS), legend=alt.Legend(title="Industry")),
+        tooltip=["industry", "runs"],
+    ).properties(height=260, title="Runs by industry").to_dict()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _timeline_spec(timeline: pd.DataFrame, grain: str) -> Dict[str, Any]:
+    """Area chart of runs per `grain` (hour or day); time column is "hour"."""
+    return alt.Chart(timeline).mark_area(line=True, point=True, color=COLORS["usage"][0], opacity=0.7).encode(
+        x=alt.X("hour:T", title="Time (UTC)"),
+        y=alt.Y("runs:Q", title="Runs"),
+        tooltip=[alt.Tooltip("hour:T", title=grain.capitalize()), "runs:Q"],
+    ).properties(height=240, title=f"Runs over time (per {grain})").to_dict()
+
+
 # ----- 1. Agent Health: success/failure rates, error breakdown, which companies/steps fail most -----
-st.header("🏥 Agent Health")
-st.caption("Success vs failure rates, error breakdown, which companies or steps fail most")
-
-total_runs = len(df_runs)
-status_col = "status"
-if status_col in df_runs.columns:
-    success_count = (df_runs[status_col] == "success").sum()
-    failure_count = (df_runs[status_col] == "failure").sum()
+@st.fragment
+def render_health(
+    df_runs: pd.DataFrame, summary: Dict[str, Any], df_companies: pd.DataFrame, df_step_stats: pd.DataFrame
+) -> None:
+    st.header("🏥 Agent Health")
+    st.caption("Success vs failure rates, error breakdown, which companies or steps fail most")
+
+    # Counted in Snowflake over the loaded runs (no pass over df_runs)
+    total_runs = int(summary.get("runs", len(df_runs)))
+    success_count = int(summary.get("successes", total_runs))
+    failure_count = int(summary.get("failures", 0))
     success_rate = 100 * success_count / total_runs if total_runs else 0
     failure_rate = 100 * failure_count / total_runs if total_runs else 0
-else:
-    success_count, failure_count = total_runs, 0
-    success_rate, failure_rate = 100.0, 0.0
-
-h1, h2, h3 = st.columns(3)
-h1.metric("Total runs", total_runs)
-h2.metric("Success rate", f"{success_rate:.1f}%")
-h3.metric("Failure rate", f"{failure_rate:.1f}%")
-
-# Chart: Which companies fail most (bar)
-if "company_name" in df_runs.columns and status_col in df_runs.columns and failure_count > 0:
-    fail_by_company = df_runs[df_runs[status_col] == "failure"].groupby("company_name", as_index=False).size()
-    fail_by_company.columns = ["company_name", "failures"]
-    fail_by_company = fail_by_company.sort_values("failures", ascending=False).head(10)
-    chart_fail = alt.Chart(fail_by_company).mark_bar(color=COLORS["health"][1]).encode(
-        x=alt.X("failures:Q", title="Failures"),
-        y=alt.Y("company_name:N", sort="-x", title="Company"),
-        tooltip=["company_name", "failures"],
-    ).properties(height=240, title="Companies with most failures")
-    st.altair_chart(chart_fail, use_container_width=True)
-
-# Chart 3 (when run_steps): Which steps fail most
-if use_snowflake and df_steps is not None and not df_steps.empty and "step_name" in df_steps.columns and "status" in df_steps.columns:
-    step_fail = df_steps[df_steps["status"] == "failure"].groupby("step_name", as_index=False).size()
-    step_fail.columns = ["step_name", "failures"]
-    if not step_fail.empty:
-        step_fail = step_fail.sort_values("failures", ascending=False).head(8)
-        chart_step_fail = alt.Chart(step_fail).mark_bar(color=COLORS["health"][2]).encode(
-            x=alt.X("failures:Q", title="Failures"),
-            y=alt.Y("step_name:N", sort="-x", title="Step"),
-            tooltip=["step_name", "failures"],
-        ).properties(height=220, title="Steps that fail most")
-        st.altair_chart(chart_step_fail, use_container_width=True)
-
-if "error_message" in df_runs.columns and df_runs["error_message"].notna().any():
-    with st.expander("Recent errors (Agent Health)"):
-        cols = [c for c in ["company_name", "run_id", "error_message", "started_at"] if c in df_runs.columns]
-        st.dataframe(df_runs[df_runs["error_message"].notna()][cols].head(10), use_container_width=True, hide_index=True)
+
+    h1, h2, h3 = st.columns(3)
+    h1.metric("Total runs", total_runs)
+    h2.metric("Success rate", f"{success_rate:.1f}%")
+    h3.metric("Failure rate", f"{failure_rate:.1f}%")
+
+    # Chart: Which companies fail most (bar) — aggregated in Snowflake
+    if not df_companies.empty and failure_count > 0:
+        fail_by_company = df_companies.loc[df_companies["failures"] > 0, ["company_name", "failures"]]
+        fail_by_company = fail_by_company.nlargest(10, "failures")
+        st.vega_lite_chart(_hbar_spec(
+            fail_by_company, "failures", "company_name", COLORS["health"][1],
+            "Companies with most failures", 240, "Failures", "Company",
+        ), use_container_width=True)
+
+    # Chart 3 (when run_steps): Which steps fail most — aggregated in Snowflake
+    if use_snowflake and not df_step_stats.empty:
+        step_fail = df_step_stats.loc[df_step_stats["failures"] > 0, ["step_name", "failures"]]
+        if not step_fail.empty:
+            step_fail = step_fail.nlargest(8, "failures")
+            st.vega_lite_chart(_hbar_spec(
+                step_fail, "failures", "step_name", COLORS["health"][2],
+                "Steps that fail most", 220, "Failures", "Step",
+            ), use_container_width=True)
+
+    if "error_message" in df_runs.columns and df_runs["error_message"].notna().any():
+        with st.expander("Recent errors (Agent Health)"):
+            cols = [c for c in ["company_name", "run_id", "error_message", "started_at"] if c in df_runs.columns]
+            st.dataframe(df_runs[df_runs["error_message"].notna()][cols].head(10), use_container_width=True, hide_index=True)
+
 
 # ----- 2. Agent Performance: run latency distribution, runs by industry -----
-st.header("⚡ Agent Performance")
-st.caption("Run latency distribution, runs by industry")
-
-# Chart 1: Run latency distribution (histogram) — how fast are runs, how spread out
-if "total_latency_ms" in df_runs.columns and df_runs["total_latency_ms"].notna().any():
-    runs_lat = df_runs[df_runs["total_latency_ms"].notna()]
-    chart_lat_hist = alt.Chart(runs_lat).mark_bar(color=COLORS["perf"][0]).encode(
-        x=alt.X("total_latency_ms:Q", bin=alt.Bin(maxbins=30), title="Run latency (ms)"),
-        y=alt.Y("count():Q", title="Number of runs"),
-        tooltip=[alt.Tooltip("total_latency_ms:Q", bin=True, title="Latency (ms)"), alt.Tooltip("count():Q", title="Runs")],
-    ).properties(height=240, title="Run latency distribution")
-    st.altair_chart(chart_lat_hist, use_container_width=True)
-
-# Chart 2: Pie chart with industries
-if "industry" in df_runs.columns and df_runs["industry"].notna().any():
-    by_ind = df_runs[df_runs["industry"].notna()].groupby("industry", as_index=False).size()
-    by_ind.columns = ["industry", "runs"]
-    if not by_ind.empty:
-        chart_ind = alt.Chart(by_ind).mark_arc(innerRadius=40).encode(
-            theta=alt.Theta("runs:Q"),
-            color=alt.Color("industry:N", scale=alt.Scale(range=CHART_COLORS), legend=alt.Legend(title="Industry")),
-            tooltip=["industry", "runs"],
-        ).properties(height=260, title="Runs by industry")
-        st.altair_chart(chart_ind, use_container_width=True)
+@st.fragment
+def render_performance(df_runs: pd.DataFrame, df_industries: pd.DataFrame) -> None:
+    st.header("⚡ Agent Performance")
+    st.caption("Run latency distribution, runs by industry")
+
+    # Chart 1: Run latency distribution (histogram) — how fast are runs, how spread out
+    # Binned here so the chart embeds 30 rows instead of every run (and every column)
+    if "total_latency_ms" in df_runs.columns and df_runs["total_latency_ms"].notna().any():
+        counts, edges = np.histogram(df_runs["total_latency_ms"].dropna().to_numpy(dtype=float), bins=30)
+        lat_hist = pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "runs": counts})
+        st.vega_lite_chart(_latency_hist_spec(lat_hist), use_container_width=True)
+
+    # Chart 2: Pie chart with industries (counted in Snowflake)
+    if not df_industries.empty:
+        st.vega_lite_chart(_industry_pie_spec(df_industries), use_container_width=True)
+
 
 # ----- 3. Usage & Demand: runs over time, top companies -----
-st.header("📈 Usage & Demand")
-st.caption("Runs over time, top companies researched")
-
-# Chart 1: Runs over time
-if "started_at" in df_runs.columns:
-    df_runs_copy = df_runs.copy()
-    df_runs_copy["hour"] = pd.to_datetime(df_runs_copy["started_at"]).dt.floor("h")
-    timeline = df_runs_copy.groupby("hour", as_index=False).size()
-    chart_timeline = alt.Chart(timeline).mark_area(line=True, point=True, color=COLORS["usage"][0], opacity=0.7).encode(
-        x=alt.X("hour:T", title="Time (UTC)"),
-        y=alt.Y("size:Q", title="Runs"),
-        tooltip=["hour:T", "size:Q"],
-    ).properties(height=240, title="Runs over time")
-    st.altair_chart(chart_timeline, use_container_width=True)
-
-# Chart 2: Top companies researched
-if "company_name" in df_runs.columns:
-    count_col = "run_id" if "run_id" in df_runs.columns else "company_name"
-    top_co = df_runs.groupby("company_name", as_index=False).agg(runs=(count_col, "count")).sort_values("runs", ascending=False).head(10)
-    chart_top = alt.Chart(top_co).mark_bar(color=COLORS["usage"][1]).encode(
-        x=alt.X("runs:Q", title="Runs"),
-        y=alt.Y("company_name:N", sort="-x", title="Company"),
-        tooltip=["company_name", "runs"],
-    ).properties(height=240, title="Top companies researched")
-    st.altair_chart(chart_top, use_container_width=True)
+MAX_TIMELINE_POINTS = 500
+
+
+@st.fragment
+def render_usage(df_hourly: pd.DataFrame, df_companies: pd.DataFrame) -> None:
+    st.header("📈 Usage & Demand")
+    st.caption("Runs over time, top companies researched")
+
+    # Chart 1: Runs over time (hourly counts from Snowflake). Long ranges are
+    # re-binned per day so the chart stays a few hundred points.
+    if not df_hourly.empty:
+        timeline, grain = df_hourly, "hour"
+        if len(timeline) > MAX_TIMELINE_POINTS:
+            timeline = df_hourly.groupby(df_hourly["hour"].dt.floor("D"), sort=False)["runs"].sum().reset_index()
+            grain = "day"
+        st.vega_lite_chart(_timeline_spec(timeline, grain), use_container_width=True)
+
+    # Chart 2: Top companies researched
+    if not df_companies.empty:
+        top_co = df_companies[["company_name", "runs"]].nlargest(10, "runs")
+        st.vega_lite_chart(_hbar_spec(
+            top_co, "runs", "company_name", COLORS["usage"][1],
+            "Top companies researched", 240, "Runs", "Company",
+        ), use_container_width=True)
+
 
 # ----- 4. Cost Efficiency: API calls per run, expensive/duplicate queries -----
-st.header("💰 Cost Efficiency")
-st.caption("API calls per run, expensive or duplicate queries (api_calls + agent_runs.total_api_calls)")
-
-api_col = "total_api_calls"
-total_calls = int(df_runs[api_col].sum()) if api_col in df_runs.columns else 0
-avg_per_run = df_runs[api_col].mean() if api_col in df_runs.columns else 0
-
-c1, c2 = st.columns(2)
-c1.metric("Total API calls (all runs)", total_calls)
-c2.metric("Avg API calls per run", f"{avg_per_run:.1f}")
-
-# Chart: Latency of each step (from run_steps)
-if use_snowflake and df_steps is not None and not df_steps.empty and "step_name" in df_steps.columns and "latency_ms" in df_steps.columns:
-    step_latency = df_steps.groupby("step_name", as_index=False)["latency_ms"].mean().sort_values("latency_ms", ascending=False)
-    chart_step_latency = alt.Chart(step_latency).mark_bar(color=COLORS["cost"][1]).encode(
-        x=alt.X("latency_ms:Q", title="Avg latency (ms)", axis=alt.Axis(format=".0f", tickMinStep=1)),
-        y=alt.Y("step_name:N", sort="-x", title="Step"),
-        tooltip=["step_name", alt.Tooltip("latency_ms:Q", format=".1f", title="Avg latency (ms)")],
-    ).properties(height=260, title="Latency of each step")
-    st.altair_chart(chart_step_latency, use_container_width=True)
-
-# Chart 2: Average cost (latency) per company — how expensive each company was
-lat_col = "total_latency_ms"
-if "company_name" in df_runs.columns and lat_col in df_runs.columns:
-    expensive_co = df_runs.groupby("company_name", as_index=False)[lat_col].mean().sort_values(lat_col, ascending=False).head(10)
-    chart_exp = alt.Chart(expensive_co).mark_bar(color=COLORS["cost"][2]).encode(
-        x=alt.X("total_latency_ms:Q", title="Avg latency (ms)"),
-        y=alt.Y("company_name:N", sort="-x", title="Company"),
-        tooltip=["company_name", "total_latency_ms"],
-    ).properties(height=260, title="Avg cost (latency) per company")
-    st.altair_chart(chart_exp, use_container_width=True)
+@st.fragment
+def render_cost(summary: Dict[str, Any], df_companies: pd.DataFrame, df_step_stats: pd.DataFrame) -> None:
+    st.header("💰 Cost Efficiency")
+    st.caption("API calls per run, expensive or duplicate queries (api_calls + agent_runs.total_api_calls)")
+
+    # SUM / AVG computed in Snowflake; AVG is NULL when no run has a count
+    total_calls = int(summary.get("total_api_calls", 0))
+    avg_calls = summary.get("avg_api_calls")
+    avg_per_run = float(avg_calls) if pd.notna(avg_calls) else 0.0
+
+    c1, c2 = st.columns(2)
+    c1.metric("Total API calls (all runs)", total_calls)
+    c2.metric("Avg API calls per run", f"{avg_per_run:.1f}")
+
+    # Chart: Latency of each step (from run_steps, averaged in Snowflake)
+    if use_snowflake and not df_step_stats.empty:
+        step_latency = df_step_stats[["step_name", "avg_latency_ms"]].sort_values("avg_latency_ms", ascending=False)
+        st.vega_lite_chart(_hbar_spec(
+            step_latency, "avg_latency_ms", "step_name", COLORS["cost"][1],
+            "Latency of each step", 260, "Avg latency (ms)", "Step",
+            axis_format=".0f", tooltip_format=".1f",
+        ), use_container_width=True)
+
+    # Chart 2: Average cost (latency) per company — how expensive each company was
+    if not df_companies.empty and df_companies["avg_latency_ms"].notna().any():
+        expensive_co = df_companies[["company_name", "avg_latency_ms"]].nlargest(10, "avg_latency_ms")
+        st.vega_lite_chart(_hbar_spec(
+            expensive_co, "avg_latency_ms", "company_name", COLORS["cost"][2],
+            "Avg cost (latency) per company", 260, "Avg latency (ms)", "Company",
+        ), use_container_width=True)
+
 
 # ----- Raw data: one window, choose which table to see -----
-st.header("📋 Raw data")
-table_options = ["Runs"]
-if use_snowflake and df_steps is not None and not df_steps.empty:
-    table_options.append("Run steps")
-if use_snowflake and df_calls is not None and not df_calls.empty:
-    table_options.append("API calls")
-
-selected_table = st.selectbox(
-    "Choose table to view",
-    options=table_options,
-    key="raw_data_table",
-)
+RAW_DATA_ROWS = 200
+RAW_DATA_COLUMNS = {
+    "Runs": ["started_at", "company_name", "industry", "status", "total_latency_ms", "total_api_calls", "error_message"],
+    "Run steps": ["run_id", "step_name", "status", "latency_ms", "error_message"],
+    "API calls": ["called_at", "run_id", "query_used", "results_returned", "latency_ms"],
+}
+
 
-if selected_table == "Runs":
-    st.dataframe(df_runs, use_container_width=True, hide_index=True)
-elif selected_table == "Run steps":
-    st.dataframe(df_steps, use_container_width=True, hide_index=True)
-else:
-    st.dataframe(df_calls, use_container_width=True, hide_index=True)
+@st.fragment
+def render_raw_data(df_runs: pd.DataFrame, fetch_key: Tuple[Optional[str], Optional[str], int]) -> None:
+    st.header("📋 Raw data")
+    selected_table = st.selectbox(
+        "Choose table to view",
+        options=["Runs", "Run steps", "API calls"],
+        key="raw_data_table",
+    )
+
+    if selected_table == "Runs":
+        df, file_name = df_runs, "agent_runs.csv"
+    else:
+        # Step and call rows are only queried once one of them is picked
+        try:
+            df_steps, df_calls = _fetch_steps_and_calls(*fetch_key)
+        except Exception as e:
+            st.error(f"Could not load {selected_table.lower()} from Snowflake.")
+            st.code(str(e), language="text")
+            return
+        if selected_table == "Run steps":
+            df, file_name = df_steps, "run_steps.csv"
+        else:
+            df, file_name = df_calls, "api_calls.csv"
+
+    # Only the display columns and first rows go to the browser; the full
+    # table is available as a CSV download.
+    cols = [c for c in RAW_DATA_COLUMNS[selected_table] if c in df.columns]
+    st.dataframe(df[cols].head(RAW_DATA_ROWS), use_container_width=True, hide_index=True)
+    st.caption(f"Showing {min(len(df), RAW_DATA_ROWS)} of {len(df)} rows")
+    st.download_button(
+        "Full CSV",
+        df.to_csv(index=False).encode("utf-8"),
+        file_name=file_name,
+        mime="text/csv",
+        key="raw_data_csv",
+    )
+
+
+# Each section is a fragment: interacting with a widget inside one (e.g. the
+# raw-data table picker) reruns only that section, not the load and every chart.
+render_health(df_runs, summary, df_companies, df_step_stats)
+render_performance(df_runs, df_industries)
+render_usage(df_hourly, df_companies)
+render_cost(summary, df_companies, df_step_stats)
+render_raw_data(df_runs, fetch_key)
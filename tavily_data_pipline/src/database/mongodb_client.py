@@ -5,21 +5,80 @@ This module provides a MongoDB client wrapper for saving and retrieving
 agent execution metadata.
 """
 
+import functools
+import logging
 import os
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional
 from datetime import datetime, timedelta
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
 from pymongo.collection import Collection
 from pymongo.database import Database
 from pymongo.errors import ConnectionFailure, OperationFailure
 
+try:
+    from ciso8601 import parse_datetime as _ciso_parse  # type: ignore
+except ImportError:  # optional speedup; datetime.fromisoformat is used otherwise
+    _ciso_parse = None
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """Parse an ISO-8601 timestamp (as written by MetadataCollector) to datetime."""
+    if _ciso_parse is not None:
+        return _ciso_parse(value)
+    # fromisoformat only accepts a trailing "Z" from Python 3.11; the collector
+    # writes "+00:00", so the common case needs no string copy
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+
+@functools.lru_cache(maxsize=4)
+def _get_client(connection_uri: str) -> MongoClient:
+    """Return a shared, pinged MongoClient per URI; clients are thread-safe and pooled."""
+    client = MongoClient(connection_uri, maxPoolSize=50)
+    # Test connection (once per URI; a failure is not cached)
+    client.admin.command('ping')
+    return client
+
+
+# Every query sorts by timestamp_utc; session and status queries also filter.
+# The compound indexes serve filter + sort together.
+_INDEXES = [
+    IndexModel([("timestamp_utc", DESCENDING)]),
+    IndexModel([("session_id", ASCENDING), ("timestamp_utc", ASCENDING)]),
+    IndexModel([("status", ASCENDING), ("timestamp_utc", DESCENDING)]),
+]
+
+
+@functools.lru_cache(maxsize=None)
+def _ensure_indexes(connection_uri: str, database_name: str, collection_name: str) -> None:
+    """Create the query indexes once per collection (create_indexes is idempotent)."""
+    collection = _get_client(connection_uri)[database_name][collection_name]
+    try:
+        collection.create_indexes(_INDEXES)
+    except OperationFailure as e:
+        # e.g. a read/write-only user; queries still work, just without indexes
+        logger.warning("Could not create MongoDB indexes on %s: %s", collection_name, e)
+
+
+def _normalize(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert ObjectId to string and datetime to ISO string (in place)."""
+    if "_id" in doc:
+        doc["_id"] = str(doc["_id"])
+    ts = doc.get("timestamp_utc")
+    if isinstance(ts, datetime):
+        doc["timestamp_utc"] = ts.isoformat()
+    return doc
+
 
 class MongoDBClient:
     """
     MongoDB client for agent metadata operations.
     
     Provides methods to:
-    - Save metadata documents
+    - Save metadata documents (one at a time or in bulk)
     - Query recent metadata
     - Query metadata by session ID
     - Query metadata by date range
@@ -46,17 +105,17 @@ class MongoDBClient:
         self.database_name = database_name
         self.collection_name = collection_name
         
-        # Initialize connection
+        # Reuse the process-wide client for this URI (connection pool, TLS and
+        # auth are paid once, not per MongoDBClient)
         try:
-            self.client = MongoClient(self.connection_uri)
-            # Test connection
-            self.client.admin.command('ping')
+            self.client = _get_client(self.connection_uri)
         except ConnectionFailure as e:
             raise ConnectionError(f"Failed to connect to MongoDB: {str(e)}") from e
         
         # Get database and collection
         self.database: Database = self.client[self.database_name]
         self.collection: Collection = self.database[self.collection_name]
+        _ensure_indexes(self.connection_uri, self.database_name, self.collection_name)
     
     def save_metadata(self, metadata: Dict[str, Any]) -> str:
         """
@@ -82,9 +141,7 @@ class MongoDBClient:
         try:
             # Ensure timestamp_utc is stored as datetime if it's a string
             if isinstance(metadata.get("timestamp_utc"), str):
-                metadata["timestamp_utc"] = datetime.fromisoformat(
-                    metadata["timestamp_utc"].replace("Z", "+00:00")
-                )
+                metadata["timestamp_utc"] = _parse_timestamp(metadata["timestamp_utc"])
             
             # Insert document
             result = self.collection.insert_one(metadata)
@@ -92,10 +149,39 @@ class MongoDBClient:
         except OperationFailure as e:
             raise RuntimeError(f"Failed to save metadata to MongoDB: {str(e)}") from e
     
+    def save_metadata_bulk(
+        self,
+        metadata_list: List[Dict[str, Any]],
+        ordered: bool = False
+    ) -> List[str]:
+        """
+        Save many metadata documents with one insert_many call.
+        
+        Args:
+            metadata_list: Metadata dictionaries (same fields as save_metadata)
+            ordered: If False, the server keeps inserting after a failed document
+            
+        Returns:
+            Inserted document IDs as strings, in input order
+        """
+        if not metadata_list:
+            return []
+        try:
+            for metadata in metadata_list:
+                # Ensure timestamp_utc is stored as datetime if it's a string
+                if isinstance(metadata.get("timestamp_utc"), str):
+                    metadata["timestamp_utc"] = _parse_timestamp(metadata["timestamp_utc"])
+            
+            result = self.collection.insert_many(metadata_list, ordered=ordered)
+            return [str(oid) for oid in result.inserted_ids]
+        except OperationFailure as e:
+            raise RuntimeError(f"Failed to save metadata to MongoDB: {str(e)}") from e
+    
     def get_recent_metadata(
         self,
         limit: int = 100,
-        hours: Optional[int] = None
+        hours: Optional[int] = None,
+        projection: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         Get recent metadata entries.
@@ -103,6 +189,8 @@ class MongoDBClient:
         Args:
             limit: Maximum number of documents to return
             hours: Optional number of hours to look back. If None, returns most recent entries.
+            projection: Optional MongoDB projection (e.g. {"query": 1, "status": 1}) so
+                callers that need a few fields skip transferring steps/api_calls.
             
         Returns:
             List of metadata documents, sorted by timestamp_utc descending
@@ -115,23 +203,51 @@ class MongoDBClient:
             query["timestamp_utc"] = {"$gte": cutoff_time}
         
         try:
-            cursor = self.collection.find(query).sort("timestamp_utc", -1).limit(limit)
-            results = list(cursor)
-            
-            # Convert ObjectId to string and datetime to ISO string
-            for doc in results:
-                doc["_id"] = str(doc["_id"])
-                if isinstance(doc.get("timestamp_utc"), datetime):
-                    doc["timestamp_utc"] = doc["timestamp_utc"].isoformat()
+            cursor = self.collection.find(query, projection).sort("timestamp_utc", -1).limit(limit)
+            return [_normalize(doc) for doc in cursor]
+        except OperationFailure as e:
+            raise RuntimeError(f"Failed to query recent metadata: {str(e)}") from e
+    
+    def iter_recent_metadata(
+        self,
+        limit: int = 100,
+        batch_size: int = 500,
+        projection: Optional[Dict[str, Any]] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Iterate the most recent metadata entries in pages.
+        
+        Args:
+            limit: Maximum number of documents to return in total
+            batch_size: Documents per page (also the cursor's server batch size)
+            projection: Optional MongoDB projection limiting the returned fields
             
-            return results
+        Yields:
+            Lists of up to batch_size metadata documents, newest first
+        """
+        try:
+            cursor = (
+                self.collection.find({}, projection)
+                .sort("timestamp_utc", -1)
+                .limit(limit)
+                .batch_size(batch_size)
+            )
+            page: List[Dict[str, Any]] = []
+            for doc in cursor:
+                page.append(_normalize(doc))
+                if len(page) >= batch_size:
+                    yield page
+                    page = []
+            if page:
+                yield page
         except OperationFailure as e:
             raise RuntimeError(f"Failed to query recent metadata: {str(e)}") from e
     
     def get_metadata_by_session(
         self,
         session_id: str,
-        limit: int = 1000
+        limit: int = 1000,
+        projection: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         Get all metadata entries for a specific session.
@@ -139,6 +255,7 @@ class MongoDBClient:
         Args:
             session_id: Session identifier to filter by
             limit: Maximum number of documents to return
+            projection: Optional MongoDB projection limiting the returned fields
             
         Returns:
             List of metadata documents for the session, sorted by timestamp_utc ascending
@@ -146,16 +263,8 @@ class MongoDBClient:
         query = {"session_id": session_id}
         
         try:
-            cursor = self.collection.find(query).sort("timestamp_utc", 1).limit(limit)
-            results = list(cursor)
-            
-            # Convert ObjectId to string and datetime to ISO string
-            for doc in results:
-                doc["_id"] = str(doc["_id"])
-                if isinstance(doc.get("timestamp_utc"), datetime):
-                    doc["timestamp_utc"] = doc["timestamp_utc"].isoformat()
-            
-            return results
+            cursor = self.collection.find(query, projection).sort("timestamp_utc", 1).limit(limit)
+            return [_normalize(doc) for doc in cursor]
         except OperationFailure as e:
             raise RuntimeError(f"Failed to query metadata by session: {str(e)}") from e
     
@@ -163,7 +272,8 @@ class MongoDBClient:
         self,
         start_date: datetime,
         end_date: datetime,
-        limit: int = 1000
+        limit: int = 1000,
+        projection: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         Get metadata entries within a date range.
@@ -172,6 +282,7 @@ class MongoDBClient:
             start_date: Start datetime (inclusive)
             end_date: End datetime (inclusive)
             limit: Maximum number of documents to return
+            projection: Optional MongoDB projection limiting the returned fields
             
         Returns:
             List of metadata documents in the date range, sorted by timestamp_utc ascending
@@ -184,23 +295,62 @@ class MongoDBClient:
         }
         
         try:
-            cursor = self.collection.find(query).sort("timestamp_utc", 1).limit(limit)
-            results = list(cursor)
-            
-            # Convert ObjectId to string and datetime to ISO string
-            for doc in results:
-                doc["_id"] = str(doc["_id"])
-                if isinstance(doc.get("timestamp_utc"), datetime):
-                    doc["timestamp_utc"] = doc["timestamp_utc"].isoformat()
+            cursor = self.collection.find(query, projection).sort("timestamp_utc", 1).limit(limit)
+            return [_normalize(doc) for doc in cursor]
+        except OperationFailure as e:
+            raise RuntimeError(f"Failed to query metadata by date range: {str(e)}") from e
+    
+    def iter_metadata_by_date_range(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        limit: int = 1000,
+        batch_size: int = 100,
+        projection: Optional[Dict[str, Any]] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Iterate metadata entries within a date range in pages.
+        
+        Args:
+            start_date: Start datetime (inclusive)
+            end_date: End datetime (inclusive)
+            limit: Maximum number of documents to return in total
+            batch_size: Documents per page (also the cursor's server batch size)
+            projection: Optional MongoDB projection limiting the returned fields
             
-            return results
+        Yields:
+            Lists of up to batch_size metadata documents, oldest first
+        """
+        query = {
+            "timestamp_utc": {
+                "$gte": start_date,
+                "$lte": end_date
+            }
+        }
+        
+        try:
+            cursor = (
+                self.collection.find(query, projection)
+                .sort("timestamp_utc", 1)
+                .limit(limit)
+                .batch_size(batch_size)
+            )
+            page: List[Dict[str, Any]] = []
+            for doc in cursor:
+                page.append(_normalize(doc))
+                if len(page) >= batch_size:
+                    yield page
+                    page = []
+            if page:
+                yield page
         except OperationFailure as e:
             raise RuntimeError(f"Failed to query metadata by date range: {str(e)}") from e
     
     def get_metadata_by_status(
         self,
         status: str,
-        limit: int = 1000
+        limit: int = 1000,
+        projection: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         Get metadata entries filtered by status (success or failure).
@@ -208,6 +358,7 @@ class MongoDBClient:
         Args:
             status: "success" or "failure"
             limit: Maximum number of documents to return
+            projection: Optional MongoDB projection limiting the returned fields
             
         Returns:
             List of metadata documents with the specified status
@@ -215,16 +366,8 @@ class MongoDBClient:
         query = {"status": status}
         
         try:
-            cursor = self.collection.find(query).sort("timestamp_utc", -1).limit(limit)
-            results = list(cursor)
-            
-            # Convert ObjectId to string and datetime to ISO string
-            for doc in results:
-                doc["_id"] = str(doc["_id"])
-                if isinstance(doc.get("timestamp_utc"), datetime):
-                    doc["timestamp_utc"] = doc["timestamp_utc"].isoformat()
-            
-            return results
+            cursor = self.collection.find(query, projection).sort("timestamp_utc", -1).limit(limit)
+            return [_normalize(doc) for doc in cursor]
         except OperationFailure as e:
             raise RuntimeError(f"Failed to query metadata by status: {str(e)}") from e
     
@@ -247,9 +390,12 @@ class MongoDBClient:
             raise RuntimeError(f"Failed to count documents: {str(e)}") from e
     
     def close(self):
-        """Close MongoDB connection."""
-        if self.client:
-            self.client.close()
+        """
+        Release this wrapper. The underlying MongoClient is shared by every
+        MongoDBClient with the same URI, so it stays open (its pooled
+        connections are reused by the next instance).
+        """
+        self.client = None
     
     def __enter__(self):
         """Context manager entry."""
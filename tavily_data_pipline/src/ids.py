@@ -0,0 +1,25 @@
+"""
+Random ID generation shared by the collector (event_id) and the streamer
+(step_id, call_id).
+
+These IDs are primary keys in MongoDB and Snowflake, but they are not
+secrets: nothing authorizes on them, so predictability does not matter. What
+matters is uniqueness, and 122 random bits per UUID4 keep collisions
+negligible with the module PRNG (Mersenne Twister) too. The PRNG avoids an
+os.urandom syscall per ID, and Python reseeds it in forked children, so
+worker processes do not repeat each other's IDs. Session IDs keep uuid4().
+"""
+
+import random
+import uuid
+from typing import List
+
+
+def new_id() -> str:
+    """Return a random UUID4 string."""
+    return str(uuid.UUID(int=random.getrandbits(128), version=4))
+
+
+def new_ids(n: int) -> List[str]:
+    """Return n random UUID4 strings."""
+    return [str(uuid.UUID(int=random.getrandbits(128), version=4)) for _ in range(n)]
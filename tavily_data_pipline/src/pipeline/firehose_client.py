@@ -5,21 +5,98 @@ Provides methods to send metadata records to a Firehose delivery stream
 with retry logic and batch processing.
 """
 
+import functools
+import gzip
+import itertools
 import json
+import logging
 import os
+import random
+import threading
 import time
-from typing import Dict, Any, List, Optional
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+from typing import Deque, Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from botocore.exceptions import NoCredentialsError
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional speedup; stdlib json is used otherwise
+    orjson = None
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # only needed for record_compression="zstd"
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# PutRecordBatch API limits
+MAX_BATCH_RECORDS = 500
+MAX_BATCH_BYTES = 4 * 1024 * 1024
+# Per-record Data limit (before base64)
+MAX_RECORD_BYTES = 1000 * 1024
+# Cap on one retry backoff, in seconds
+MAX_RETRY_DELAY = 30.0
+
+# Shared botocore config: a larger keep-alive pool for concurrent puts and
+# adaptive retries so throttling backs off client-side instead of failing.
+AWS_CFG = Config(
+    max_pool_connections=50,
+    retries={"mode": "adaptive", "max_attempts": 10},
+    tcp_keepalive=True,
+)
+# Firehose puts are retried by FirehoseClient._put_chunk (only the rejected
+# entries, with jittered backoff), so botocore makes a single attempt there;
+# stacking both layers would multiply into ~30 attempts per throttled chunk.
+# Adaptive mode still rate-limits sends client-side.
+FIREHOSE_CFG = AWS_CFG.merge(Config(retries={"mode": "adaptive", "max_attempts": 1}))
+
+
+@functools.lru_cache(maxsize=None)
+def _session(region: str) -> "boto3.session.Session":
+    """Return one boto3 Session per region, shared by its STS and Firehose clients."""
+    return boto3.session.Session(region_name=region)
+
+
+@functools.lru_cache(maxsize=None)
+def _client(service: str, region: str):
+    """Return a shared boto3 client per (service, region); clients are thread-safe.
+
+    Both clients come from the region's Session, so the credential chain is
+    resolved and the service models are loaded once instead of per client.
+    """
+    config = FIREHOSE_CFG if service == "firehose" else AWS_CFG
+    return _session(region).client(service, config=config)
+
+
+# Per-thread zstd compressor (compressors are not thread-safe)
+_LOCAL = threading.local()
+
+# (region, access key) pairs already validated with STS in this process
+_creds_checked: Set[Tuple[str, str]] = set()
+
+
+def _json_default(value: Any) -> str:
+    """Serialize values JSON lacks a type for: dates/datetimes as ISO strings, others via str()."""
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
 
 class FirehoseClient:
     """
     Client for streaming metadata records to AWS Kinesis Firehose.
     
-    Records are buffered by Firehose and delivered to S3 based on
-    buffer size (5MB) or buffer interval (60 seconds).
+    Records are buffered by Firehose and delivered to S3 based on the
+    delivery stream's buffering hints and S3 CompressionFormat. Those are
+    set on the stream in AWS, not by this client (a 1 MB / 60 s buffer gets
+    low-volume runs to S3 sooner; Snowpipe loads GZIP objects as-is).
+    Client-side per-record compression is record_compression below.
     """
     
     def __init__(
@@ -27,7 +104,9 @@ class FirehoseClient:
         stream_name: Optional[str] = None,
         region: Optional[str] = None,
         max_retries: int = 3,
-        retry_delay: float = 1.0
+        retry_delay: float = 1.0,
+        record_compression: Optional[str] = None,
+        aggregate_records: Optional[bool] = None
     ):
         """
         Initialize Firehose client.
@@ -37,19 +116,44 @@ class FirehoseClient:
             region: AWS region. Reads from AWS_REGION env if None.
             max_retries: Maximum retry attempts for failed deliveries
             retry_delay: Base delay in seconds for exponential backoff
+            record_compression: "gzip" or "zstd" to compress each record before sending,
+                or "none". Reads from FIREHOSE_RECORD_COMPRESSION env if None (default
+                "none"). Only compress with a stream whose S3 CompressionFormat is
+                UNCOMPRESSED and that does not partition on record JSON. "zstd" (level 3,
+                needs the zstandard package) suits aggregate_records: ~1 MB payloads
+                compress far better and faster than with gzip.
+            aggregate_records: Pack many newline-delimited metadata records into each
+                Firehose record (up to 1000 KiB) instead of one each. Reads from
+                FIREHOSE_AGGREGATE_RECORDS env if None (default off). With dynamic
+                partitioning on record_type, the stream needs the RecordDeAggregation
+                processor (SubRecordType JSON) to split them again.
         """
         self.stream_name = stream_name or os.getenv("FIREHOSE_STREAM_NAME")
         self.region = region or os.getenv("AWS_REGION", "us-east-1")
         self.max_retries = max_retries
         self.retry_delay = retry_delay
         
+        self.record_compression = (
+            record_compression or os.getenv("FIREHOSE_RECORD_COMPRESSION") or "none"
+        ).lower()
+        if aggregate_records is None:
+            aggregate_records = os.getenv("FIREHOSE_AGGREGATE_RECORDS", "").lower() in ("1", "true", "yes")
+        self.aggregate_records = aggregate_records
+        
         if not self.stream_name:
             raise ValueError("FIREHOSE_STREAM_NAME must be provided or set as environment variable")
+        if self.record_compression not in ("none", "gzip", "zstd"):
+            raise ValueError(
+                f"Unsupported record compression {self.record_compression!r}; "
+                "use 'gzip', 'zstd' or 'none'"
+            )
+        if self.record_compression == "zstd" and zstandard is None:
+            raise ValueError("FIREHOSE_RECORD_COMPRESSION=zstd requires the zstandard package")
 
         # Validate credentials early with a cheap call (optional; boto3 will fail on first API call otherwise)
         self._ensure_credentials()
 
-        self.client = boto3.client("firehose", region_name=self.region)
+        self.client = _client("firehose", self.region)
 
     def _ensure_credentials(self) -> None:
         """Verify AWS credentials are set and valid; raise with helpful message if not."""
@@ -60,8 +164,12 @@ class FirehoseClient:
                 "AWS credentials not set. In .env set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY. "
                 "Create them in IAM → Users → Your user → Security credentials → Create access key."
             )
+        # STS is a network round-trip; one successful check per key and region is enough
+        key = (self.region, access)
+        if key in _creds_checked:
+            return
         try:
-            sts = boto3.client("sts", region_name=self.region)
+            sts = _client("sts", self.region)
             sts.get_caller_identity()
         except NoCredentialsError:
             raise ValueError(
@@ -78,13 +186,72 @@ class FirehoseClient:
                     "4) If using temporary credentials, refresh AWS_SESSION_TOKEN."
                 ) from e
             raise
+        _creds_checked.add(key)
     
+    def _serialize(self, record: Dict[str, Any]) -> bytes:
+        """Encode one metadata dict as a UTF-8 JSON line (without _id).
+
+        Datetime values are written as ISO-8601 strings, so callers need not
+        convert them first.
+        """
+        # Remove _id if present (MongoDB ObjectId); streamer records never have
+        # one, so the copy is only made for raw documents
+        if "_id" in record:
+            record = {k: v for k, v in record.items() if k != "_id"}
+        if orjson:
+            # Encodes straight to UTF-8 bytes, newline included; datetimes are
+            # native (same ISO format as isoformat()), other types via default
+            return orjson.dumps(record, default=_json_default, option=orjson.OPT_APPEND_NEWLINE)
+        return (json.dumps(record, default=_json_default) + "\n").encode("utf-8")
+
+    def _compress(self, data: bytes) -> bytes:
+        """Apply the configured record compression to one Firehose record payload."""
+        if self.record_compression == "gzip":
+            # Each record becomes one gzip member; concatenated members in an S3
+            # object still decompress as a single newline-delimited JSON stream.
+            return gzip.compress(data, compresslevel=1)
+        if self.record_compression == "zstd":
+            # Same idea with zstd frames. Compressors are not thread-safe, so
+            # each thread keeps its own.
+            compressor = getattr(_LOCAL, "zstd", None)
+            if compressor is None:
+                compressor = _LOCAL.zstd = zstandard.ZstdCompressor(level=3)
+            return compressor.compress(data)
+        return data
+
     def _record_to_firehose_format(self, record: Dict[str, Any]) -> bytes:
-        """Convert metadata dict to Firehose record format (JSON bytes)."""
-        # Remove _id if present (MongoDB ObjectId)
-        clean = {k: v for k, v in record.items() if k != "_id"}
-        return (json.dumps(clean) + "\n").encode("utf-8")
-    
+        """Convert metadata dict to Firehose record format (JSON bytes, optionally compressed)."""
+        return self._compress(self._serialize(record))
+
+    def _encode(self, records: Iterable[Dict[str, Any]]) -> Iterator[Tuple[bytes, int]]:
+        """
+        Yield (Firehose Data payload, number of metadata records in it).
+
+        Without aggregation every metadata record is its own payload. With it,
+        consecutive JSON lines are packed into payloads of up to
+        MAX_RECORD_BYTES, so small records don't each cost a Firehose record
+        (and its 5 KB billing minimum).
+        """
+        if not self.aggregate_records:
+            for record in records:
+                yield self._record_to_firehose_format(record), 1
+            return
+        parts: List[bytes] = []
+        size = 0
+        for record in records:
+            line = self._serialize(record)
+            if parts and size + len(line) > MAX_RECORD_BYTES:
+                yield self._compress(b"".join(parts)), len(parts)
+                parts, size = [], 0
+            if len(line) > MAX_RECORD_BYTES:
+                # Oversized on its own; sent as-is and rejected by Firehose
+                yield self._compress(line), 1
+                continue
+            parts.append(line)
+            size += len(line)
+        if parts:
+            yield self._compress(b"".join(parts)), len(parts)
+
     def send_metadata(self, metadata: Dict[str, Any]) -> bool:
         """
         Send a single metadata record to Firehose.
@@ -97,62 +264,183 @@ class FirehoseClient:
         """
         return self.send_batch([metadata]) == 1
     
-    def send_batch(self, records: List[Dict[str, Any]]) -> int:
+    def _chunk(
+        self, records: Iterable[Dict[str, Any]], batch_size: int, max_batch_bytes: int
+    ) -> Iterator[Tuple[List[Dict[str, bytes]], List[int]]]:
+        """
+        Group encoded records into chunks bounded by Firehose record count and
+        total bytes. Yields (chunk, metadata records in each chunk entry).
+        """
+        chunk: List[Dict[str, bytes]] = []
+        counts: List[int] = []
+        chunk_bytes = 0
+        for data, count in self._encode(records):
+            if chunk and (len(chunk) >= batch_size or chunk_bytes + len(data) > max_batch_bytes):
+                yield chunk, counts
+                chunk, counts, chunk_bytes = [], [], 0
+            chunk.append({"Data": data})
+            counts.append(count)
+            chunk_bytes += len(data)
+        if chunk:
+            yield chunk, counts
+
+    def _backoff(self, attempt: int) -> None:
+        """Sleep a random "full jitter" delay up to retry_delay * 2**attempt (capped).
+
+        Jitter keeps concurrent senders that were throttled together from
+        retrying in lockstep; with several chunks in flight only the worker
+        retrying its chunk sleeps, the others keep sending.
+        """
+        time.sleep(random.uniform(0, min(self.retry_delay * (2 ** attempt), MAX_RETRY_DELAY)))
+
+    def _put_chunk(self, firehose_records: List[Dict[str, bytes]], counts: List[int]) -> int:
+        """
+        Send one PutRecordBatch chunk with retries.
+
+        After a partial failure only the entries Firehose rejected are resent,
+        so delivered records are not duplicated downstream.
+
+        Args:
+            firehose_records: Encoded {"Data": ...} entries
+            counts: Metadata records in each entry (1 unless aggregated)
+
+        Returns:
+            Number of metadata records delivered (entries still failing after
+            the last retry are not raised)
+        """
+        sent = 0
+        for attempt in range(self.max_retries):
+            try:
+                response = self.client.put_record_batch(
+                    DeliveryStreamName=self.stream_name,
+                    Records=firehose_records
+                )
+                failed = response.get("FailedPutCount", 0)
+                if failed == 0:
+                    return sent + sum(counts)
+                # RequestResponses is in request order; failed entries carry an ErrorCode
+                failed_idx = [
+                    i for i, r in enumerate(response.get("RequestResponses", [])) if r.get("ErrorCode")
+                ]
+                if not failed_idx:
+                    # Failures reported but none identifiable: nothing to resend
+                    logger.warning(
+                        "Firehose reported %d failed records without error codes; "
+                        "dropping %d unconfirmed records", failed, sum(counts)
+                    )
+                    return sent
+                sent += sum(counts) - sum(counts[i] for i in failed_idx)
+                firehose_records = [firehose_records[i] for i in failed_idx]
+                counts = [counts[i] for i in failed_idx]
+                # Retry failed records
+                if attempt < self.max_retries - 1:
+                    self._backoff(attempt)
+            except ClientError as e:
+                error_code = e.response.get("Error", {}).get("Code", "")
+                if error_code == "UnrecognizedClientException" or "security token" in str(e).lower():
+                    raise ValueError(
+                        "AWS rejected the security token (invalid or expired). "
+                        "Fix: 1) IAM → Users → Your user → Security credentials → Create access key; "
+                        "put Access key ID and Secret in .env as AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY. "
+                        "2) No typos or extra spaces in .env. "
+                        "3) Same AWS account as the Firehose stream. "
+                        "4) If using temporary credentials, refresh AWS_SESSION_TOKEN."
+                    ) from e
+                if attempt < self.max_retries - 1:
+                    self._backoff(attempt)
+                elif sent:
+                    # Earlier attempts delivered part of the chunk; report that
+                    # instead of raising and losing the count
+                    logger.warning(
+                        "Firehose put_record_batch failed after partial delivery "
+                        "(%d sent, %d not sent): %s", sent, sum(counts), e
+                    )
+                    return sent
+                else:
+                    raise RuntimeError(f"Firehose put_record_batch failed: {e}") from e
+        # Log but don't raise - partial success
+        if counts:
+            logger.warning("Firehose rejected %d records after %d attempts", sum(counts), self.max_retries)
+        return sent
+
+    def send_batch(
+        self,
+        records: List[Dict[str, Any]],
+        batch_size: int = MAX_BATCH_RECORDS,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+        max_workers: int = 8,
+    ) -> int:
         """
         Send a batch of metadata records to Firehose.
         
-        Firehose limits: max 500 records per PutRecordBatch, max 5MB total.
-        Uses batches of 25 records for safety.
+        Firehose limits: max 500 records per PutRecordBatch, max 4 MiB total.
+        Chunks are packed greedily up to both limits, so small records share a
+        call (~N/500 calls) while large ones are split on the byte budget;
+        pass a smaller batch_size to cap records per call. With
+        aggregate_records, the limits apply to packed Firehose records rather
+        than metadata records.
+        When records span several PutRecordBatch calls, up to max_workers of
+        them are in flight at once on the shared (thread-safe) boto3 client.
         
         Args:
             records: List of metadata dictionaries
+            batch_size: Max Firehose records per PutRecordBatch call (<= 500)
+            max_batch_bytes: Max encoded bytes per PutRecordBatch call
+            max_workers: Max concurrent PutRecordBatch calls
             
         Returns:
-            Number of records successfully sent
+            Number of metadata records successfully sent
         """
         if not records:
             return 0
-        
-        batch_size = 25
+        return self.send_iter(records, batch_size, max_batch_bytes, max_workers)
+
+    def send_iter(
+        self,
+        records: Iterable[Dict[str, Any]],
+        batch_size: int = MAX_BATCH_RECORDS,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+        max_workers: int = 8,
+    ) -> int:
+        """
+        Send metadata records from any iterable (e.g. a generator) to Firehose.
+
+        Same batching, aggregation and concurrency as send_batch, but records
+        are pulled and encoded incrementally, so callers can stream documents
+        without building the full record list first.
+
+        Args:
+            records: Iterable of metadata dictionaries
+            batch_size: Max Firehose records per PutRecordBatch call (<= 500)
+            max_batch_bytes: Max encoded bytes per PutRecordBatch call
+            max_workers: Max concurrent PutRecordBatch calls
+
+        Returns:
+            Number of metadata records successfully sent
+        """
+        batch_size = min(batch_size, MAX_BATCH_RECORDS)
+        max_batch_bytes = min(max_batch_bytes, MAX_BATCH_BYTES)
+        chunks = self._chunk(records, batch_size, max_batch_bytes)
+
+        first = next(chunks, None)
+        if first is None:
+            return 0
+        second = next(chunks, None)
+        if second is None:
+            # Single call (the common per-run case): no thread pool needed
+            return self._put_chunk(*first)
+        all_chunks = itertools.chain((first, second), chunks)
+        if max_workers <= 1:
+            return sum(self._put_chunk(*chunk) for chunk in all_chunks)
+
         sent = 0
-        
-        for i in range(0, len(records), batch_size):
-            batch = records[i : i + batch_size]
-            firehose_records = [
-                {"Data": self._record_to_firehose_format(r)}
-                for r in batch
-            ]
-            
-            for attempt in range(self.max_retries):
-                try:
-                    response = self.client.put_record_batch(
-                        DeliveryStreamName=self.stream_name,
-                        Records=firehose_records
-                    )
-                    failed = response.get("FailedPutCount", 0)
-                    if failed == 0:
-                        sent += len(batch)
-                        break
-                    # Retry failed records
-                    if attempt < self.max_retries - 1:
-                        time.sleep(self.retry_delay * (2 ** attempt))
-                    else:
-                        # Log but don't raise - partial success
-                        break
-                except ClientError as e:
-                    error_code = e.response.get("Error", {}).get("Code", "")
-                    if error_code == "UnrecognizedClientException" or "security token" in str(e).lower():
-                        raise ValueError(
-                            "AWS rejected the security token (invalid or expired). "
-                            "Fix: 1) IAM → Users → Your user → Security credentials → Create access key; "
-                            "put Access key ID and Secret in .env as AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY. "
-                            "2) No typos or extra spaces in .env. "
-                            "3) Same AWS account as the Firehose stream. "
-                            "4) If using temporary credentials, refresh AWS_SESSION_TOKEN."
-                        ) from e
-                    if attempt < self.max_retries - 1:
-                        time.sleep(self.retry_delay * (2 ** attempt))
-                    else:
-                        raise RuntimeError(f"Firehose put_record_batch failed: {e}") from e
-        
+        # Encoding stays lazy: at most 2 * max_workers chunks are held at once
+        in_flight: Deque["Future[int]"] = deque()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="firehose-put") as pool:
+            for chunk in all_chunks:
+                if len(in_flight) >= 2 * max_workers:
+                    sent += in_flight.popleft().result()
+                in_flight.append(pool.submit(self._put_chunk, *chunk))
+            while in_flight:
+                sent += in_flight.popleft().result()
         return sent
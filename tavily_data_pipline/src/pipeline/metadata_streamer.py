@@ -6,22 +6,32 @@ agent_run, run_step, api_call.  Handles both enriched metadata (with real
 steps/api_calls lists) and legacy flat metadata (synthetic single step/call).
 """
 
+import logging
 import os
-import time
-import uuid
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+import queue
+import threading
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Iterable, Iterator
 
-from src.database.mongodb_client import MongoDBClient
-from src.pipeline.firehose_client import FirehoseClient
+from src.ids import new_ids
+from src.pipeline.firehose_client import FirehoseClient, MAX_BATCH_RECORDS
 
+if TYPE_CHECKING:
+    from src.database.mongodb_client import MongoDBClient
 
-def _ensure_ts(ts: Any) -> str:
-    """Return ISO string for timestamp (datetime or string)."""
+logger = logging.getLogger(__name__)
+
+
+def _ensure_ts(ts: Any, now_iso: Optional[str] = None) -> str:
+    """Return ISO string for timestamp (datetime or string).
+
+    A missing timestamp becomes now_iso if given (one value shared by a whole
+    batch), else the current UTC time.
+    """
     if isinstance(ts, datetime):
         return ts.isoformat()
     if ts is None:
-        return datetime.utcnow().isoformat()
+        return now_iso or datetime.utcnow().isoformat()
     return str(ts)
 
 
@@ -29,10 +39,16 @@ def _ensure_ts(ts: Any) -> str:
 # Record builders — enriched metadata (multi-step agent)
 # ------------------------------------------------------------------
 
-def _to_agent_run(doc: Dict[str, Any]) -> Dict[str, Any]:
-    started = _ensure_ts(doc.get("started_at_utc") or doc.get("timestamp_utc"))
-    completed = _ensure_ts(doc.get("completed_at_utc") or doc.get("timestamp_utc"))
+def _to_agent_run(doc: Dict[str, Any], now_iso: Optional[str] = None) -> Dict[str, Any]:
+    started = _ensure_ts(doc.get("started_at_utc") or doc.get("timestamp_utc"), now_iso)
+    completed = _ensure_ts(doc.get("completed_at_utc") or doc.get("timestamp_utc"), now_iso)
     api_calls = doc.get("api_calls", [])
+    # Cache hits never reached Tavily/OpenAI, so they don't count as calls
+    # (they stay in api_calls, flagged cache_hit)
+    total_api_calls = (
+        sum(1 for call in api_calls if not call.get("cache_hit"))
+        if api_calls else doc.get("num_sources", 0)
+    )
     return {
         "record_type": "agent_run",
         "run_id": doc.get("event_id"),
@@ -42,32 +58,48 @@ def _to_agent_run(doc: Dict[str, Any]) -> Dict[str, Any]:
         "started_at": started,
         "completed_at": completed,
         "total_latency_ms": doc.get("latency_ms"),
-        "total_api_calls": len(api_calls) if api_calls else doc.get("num_sources", 0),
+        "total_api_calls": total_api_calls,
         "error_message": doc.get("error_message"),
     }
 
 
-def _step_to_run_step(doc: Dict[str, Any], step: Dict[str, Any]) -> Dict[str, Any]:
+def _run_defaults(doc: Dict[str, Any], now_iso: Optional[str] = None) -> Dict[str, Any]:
+    """Doc-level fields the step/call builders fall back to, read once per run."""
     return {
-        "record_type": "run_step",
-        "step_id": str(uuid.uuid4()),
         "run_id": doc.get("event_id"),
-        "step_name": step.get("step_name", "research"),
-        "status": step.get("status", doc.get("status")),
-        "latency_ms": step.get("latency_ms", doc.get("latency_ms")),
-        "error_message": step.get("error"),
+        "query": doc.get("query"),
+        "status": doc.get("status"),
+        "latency_ms": doc.get("latency_ms"),
+        "num_sources": doc.get("num_sources", 0),
+        "called_at": _ensure_ts(doc.get("timestamp_utc"), now_iso),
+    }
+
+
+def _step_to_run_step(run: Dict[str, Any], step: Dict[str, Any], step_id: str) -> Dict[str, Any]:
+    get = step.get
+    return {
+        "record_type": "run_step",
+        "step_id": step_id,
+        "run_id": run["run_id"],
+        "step_name": get("step_name", "research"),
+        "status": get("status", run["status"]),
+        "latency_ms": get("latency_ms", run["latency_ms"]),
+        "error_message": get("error"),
     }
 
 
-def _call_to_api_call(doc: Dict[str, Any], call: Dict[str, Any]) -> Dict[str, Any]:
+def _call_to_api_call(run: Dict[str, Any], call: Dict[str, Any], call_id: str) -> Dict[str, Any]:
+    get = call.get
+    called_at = get("called_at")
     return {
         "record_type": "api_call",
-        "call_id": str(uuid.uuid4()),
-        "run_id": doc.get("event_id"),
-        "query_used": call.get("query", doc.get("query")),
-        "results_returned": call.get("results_returned", doc.get("num_sources", 0)),
-        "latency_ms": call.get("latency_ms", doc.get("latency_ms")),
-        "called_at": _ensure_ts(call.get("called_at") or doc.get("timestamp_utc")),
+        "call_id": call_id,
+        "run_id": run["run_id"],
+        "query_used": get("query", run["query"]),
+        "results_returned": get("results_returned", run["num_sources"]),
+        "latency_ms": get("latency_ms", run["latency_ms"]),
+        "called_at": _ensure_ts(called_at) if called_at else run["called_at"],
+        "cache_hit": bool(get("cache_hit", False)),
     }
 
 
@@ -75,11 +107,11 @@ def _call_to_api_call(doc: Dict[str, Any], call: Dict[str, Any]) -> Dict[str, An
 # Legacy record builders — flat metadata (single-step agent)
 # ------------------------------------------------------------------
 
-def _flat_to_run_step(doc: Dict[str, Any]) -> Dict[str, Any]:
+def _flat_to_run_step(doc: Dict[str, Any], step_id: str) -> Dict[str, Any]:
     """Synthetic single step for legacy flat metadata."""
     return {
         "record_type": "run_step",
-        "step_id": str(uuid.uuid4()),
+        "step_id": step_id,
         "run_id": doc.get("event_id"),
         "step_name": "research",
         "status": doc.get("status"),
@@ -88,17 +120,20 @@ def _flat_to_run_step(doc: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def _flat_to_api_call(doc: Dict[str, Any]) -> Dict[str, Any]:
+def _flat_to_api_call(
+    doc: Dict[str, Any], call_id: str, now_iso: Optional[str] = None
+) -> Dict[str, Any]:
     """Synthetic single API call for legacy flat metadata."""
-    ts = _ensure_ts(doc.get("timestamp_utc"))
+    ts = _ensure_ts(doc.get("timestamp_utc"), now_iso)
     return {
         "record_type": "api_call",
-        "call_id": str(uuid.uuid4()),
+        "call_id": call_id,
         "run_id": doc.get("event_id"),
         "query_used": doc.get("query"),
         "results_returned": doc.get("num_sources", 0),
         "latency_ms": doc.get("latency_ms"),
         "called_at": ts,
+        "cache_hit": False,
     }
 
 
@@ -106,31 +141,113 @@ def _flat_to_api_call(doc: Dict[str, Any]) -> Dict[str, Any]:
 # Orchestrator — picks enriched or legacy path
 # ------------------------------------------------------------------
 
-def _metadata_to_records(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+def _metadata_to_records(doc: Dict[str, Any], now_iso: Optional[str] = None) -> List[Dict[str, Any]]:
     """Build all Firehose records from a metadata document.
 
     Handles both enriched metadata (with steps/api_calls lists from the
     multi-step agent) and legacy flat metadata (synthetic single step/call).
+    now_iso, if given, stands in for any missing timestamp.
     """
-    records: List[Dict[str, Any]] = [_to_agent_run(doc)]
+    records: List[Dict[str, Any]] = [_to_agent_run(doc, now_iso)]
 
     steps = doc.get("steps", [])
+    api_calls = doc.get("api_calls", [])
+    # One step_id/call_id per sub-record (legacy docs get one synthetic each)
+    ids = iter(new_ids((len(steps) or 1) + (len(api_calls) or 1)))
+
+    # Legacy docs use the flat builders, which read the doc directly
+    run = _run_defaults(doc, now_iso) if steps or api_calls else {}
+
     if steps:
         for step in steps:
-            records.append(_step_to_run_step(doc, step))
+            records.append(_step_to_run_step(run, step, next(ids)))
     else:
-        records.append(_flat_to_run_step(doc))
+        records.append(_flat_to_run_step(doc, next(ids)))
 
-    api_calls = doc.get("api_calls", [])
     if api_calls:
         for call in api_calls:
-            records.append(_call_to_api_call(doc, call))
+            records.append(_call_to_api_call(run, call, next(ids)))
     else:
-        records.append(_flat_to_api_call(doc))
+        records.append(_flat_to_api_call(doc, next(ids), now_iso))
 
     return records
 
 
+# Fields read by the record builders above; everything else (e.g. _id,
+# response_size_chars, session_id) is left on the server.
+_STREAM_PROJECTION = {
+    "_id": 0,
+    **{f: 1 for f in (
+        "event_id", "timestamp_utc", "started_at_utc", "completed_at_utc",
+        "query", "company_name", "industry", "status", "latency_ms",
+        "num_sources", "error_message", "steps", "api_calls",
+    )},
+}
+
+
+def _prefetch(
+    batches: Iterable[List[Dict[str, Any]]], depth: int = 2
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield batches while a background thread fetches the next ones.
+
+    The bounded queue keeps at most `depth` batches in memory; if the
+    consumer stops early, the producer thread exits on its next put.
+    """
+    q: "queue.Queue[Any]" = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for batch in batches:
+                if not put(batch):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+# Per-table delivery streams (optional): record_type -> stream name env var
+_TYPE_STREAM_ENV = {
+    "agent_run": "FIREHOSE_RUNS_STREAM_NAME",
+    "run_step": "FIREHOSE_STEPS_STREAM_NAME",
+    "api_call": "FIREHOSE_CALLS_STREAM_NAME",
+}
+
+
+def _type_clients_from_env() -> Optional[Dict[str, FirehoseClient]]:
+    """Build one FirehoseClient per record type if all three stream env vars are set."""
+    names = {t: os.getenv(env) for t, env in _TYPE_STREAM_ENV.items()}
+    if not all(names.values()):
+        return None
+    try:
+        return {t: FirehoseClient(stream_name=name) for t, name in names.items()}
+    except ValueError:
+        return None
+
+
 class MetadataStreamer:
     """
     Streams agent metadata from MongoDB to AWS Kinesis Firehose.
@@ -138,82 +255,148 @@ class MetadataStreamer:
     Can run in two modes:
     1. One-shot: stream recent N documents
     2. Polling: stream documents since last run (tracks timestamp)
+    
+    By default every record goes to one stream and carries a record_type
+    field for dynamic partitioning. With type_clients (or the
+    FIREHOSE_RUNS/STEPS/CALLS_STREAM_NAME env vars), each record type goes
+    to its own stream and record_type is dropped from the payload.
     """
     
     def __init__(
         self,
-        mongo_client: Optional[MongoDBClient] = None,
+        mongo_client: Optional["MongoDBClient"] = None,
         firehose_client: Optional[FirehoseClient] = None,
-        batch_size: int = 25
+        batch_size: int = 25,
+        type_clients: Optional[Dict[str, FirehoseClient]] = None
     ):
         self.mongo_client = mongo_client
         self.firehose_client = firehose_client
         self.batch_size = batch_size
+        self.type_clients = type_clients if type_clients is not None else _type_clients_from_env()
         
         if self.mongo_client is None:
+            # Imported here so pymongo is only loaded when a client is built,
+            # not by importing this module or when a client is passed in
+            from src.database.mongodb_client import MongoDBClient
             try:
                 self.mongo_client = MongoDBClient()
             except ValueError:
                 self.mongo_client = None
         
-        if self.firehose_client is None:
+        if self.firehose_client is None and not self.type_clients:
             try:
                 self.firehose_client = FirehoseClient()
             except ValueError:
                 self.firehose_client = None
     
-    def _prepare_record(self, doc: Dict[str, Any]) -> Dict[str, Any]:
-        """Prepare record for Firehose (no _id, datetimes as ISO strings)."""
-        record = {k: v for k, v in doc.items() if k != "_id"}
-        for key, value in list(record.items()):
-            if isinstance(value, datetime):
-                record[key] = value.isoformat()
-        return record
-
-    def _to_firehose_records(self, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Convert a metadata document into prepared Firehose records."""
-        return [self._prepare_record(r) for r in _metadata_to_records(metadata)]
-
-    def stream_recent(self, limit: int = 100) -> int:
+    def _to_firehose_records(
+        self, metadata: Dict[str, Any], now_iso: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Convert a metadata document into Firehose records.
+
+        The builders copy only the fields they need, so the records never carry
+        _id (the stream queries also project it away); datetimes are
+        ISO-formatted by the encoder.
+        """
+        return _metadata_to_records(metadata, now_iso)
+
+    def _iter_firehose_records(self, docs: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Lazily yield the Firehose records of many documents (no flattened list).
+
+        Documents missing a timestamp all get the same "now", taken once per batch.
+        """
+        now_iso = datetime.utcnow().isoformat()
+        for doc in docs:
+            yield from self._to_firehose_records(doc, now_iso)
+
+    @property
+    def _can_send(self) -> bool:
+        return bool(self.firehose_client or self.type_clients)
+
+    def _send(self, records: Iterable[Dict[str, Any]], **kwargs: Any) -> int:
+        """Send records to the shared stream, or split them by type across type_clients.
+
+        Records whose type has no entry in type_clients go to firehose_client
+        unchanged if one is set, otherwise they are skipped with a warning.
+        """
+        if not self.type_clients:
+            return self.firehose_client.send_iter(records, **kwargs)
+        # One pass: route each record, copying it without the now-redundant
+        # discriminator (the caller's dict is left as is)
+        by_type: Dict[str, List[Dict[str, Any]]] = {t: [] for t in self.type_clients}
+        unrouted: List[Dict[str, Any]] = []
+        for record in records:
+            routed = by_type.get(record.get("record_type"))
+            if routed is None:
+                unrouted.append(record)
+            else:
+                routed.append({k: v for k, v in record.items() if k != "record_type"})
+        sent = sum(
+            self.type_clients[t].send_iter(rs, **kwargs) for t, rs in by_type.items() if rs
+        )
+        if unrouted:
+            if self.firehose_client:
+                sent += self.firehose_client.send_iter(unrouted, **kwargs)
+            else:
+                logger.warning(
+                    "Skipped %d records with no stream for their record_type %s",
+                    len(unrouted), sorted({str(r.get("record_type")) for r in unrouted}),
+                )
+        return sent
+
+    def stream_recent(self, limit: int = 100, page_size: int = MAX_BATCH_RECORDS) -> int:
         """
         Stream the N most recent metadata documents from MongoDB to Firehose.
         
+        MongoDB is read in pages of page_size documents on a background
+        thread, so the next page is fetched while the current one is sent;
+        send_iter packs each page into full-size PutRecordBatch calls
+        (500 records / 4 MiB).
+        
         Args:
             limit: Maximum number of documents to stream
+            page_size: Documents per MongoDB page / send
             
         Returns:
             Number of records successfully sent to Firehose
         """
-        if not self.mongo_client or not self.firehose_client:
+        if not self.mongo_client or not self._can_send:
             return 0
         
-        docs = self.mongo_client.get_recent_metadata(limit=limit)
-        if not docs:
-            return 0
-        
-        records = [r for d in docs for r in self._to_firehose_records(d)]
-        return self.firehose_client.send_batch(records)
-
-    def stream_since(self, since: datetime) -> int:
+        pages = self.mongo_client.iter_recent_metadata(
+            limit=limit, batch_size=page_size, projection=_STREAM_PROJECTION,
+        )
+        sent = 0
+        for docs in _prefetch(pages):
+            sent += self._send(self._iter_firehose_records(docs))
+        return sent
+
+    def stream_since(self, since: datetime, limit: int = 1000, page_size: int = 100) -> int:
         """
         Stream metadata documents since the given timestamp.
         
+        MongoDB is read in pages of page_size documents on a background
+        thread, so the next page is fetched while the current one is sent.
+        
         Args:
             since: Start datetime (exclusive)
+            limit: Maximum number of documents to stream
+            page_size: Documents per MongoDB page / send
             
         Returns:
             Number of records successfully sent
         """
-        if not self.mongo_client or not self.firehose_client:
+        if not self.mongo_client or not self._can_send:
             return 0
         
         end = datetime.utcnow()
-        docs = self.mongo_client.get_metadata_by_date_range(since, end, limit=1000)
-        if not docs:
-            return 0
-
-        records = [r for d in docs for r in self._to_firehose_records(d)]
-        return self.firehose_client.send_batch(records)
+        pages = self.mongo_client.iter_metadata_by_date_range(
+            since, end, limit=limit, batch_size=page_size, projection=_STREAM_PROJECTION,
+        )
+        sent = 0
+        for docs in _prefetch(pages):
+            sent += self._send(self._iter_firehose_records(docs))
+        return sent
 
     def stream_metadata(self, metadata: Dict[str, Any]) -> bool:
         """
@@ -225,9 +408,14 @@ class MetadataStreamer:
         Returns:
             True if all records sent successfully
         """
-        if not self.firehose_client:
+        if not self._can_send:
             return False
 
         records = self._to_firehose_records(metadata)
-        sent = self.firehose_client.send_batch(records)
-        return sent == len(records)
+        total = len(records)
+        return self._send(records) == total
+
+    def close(self) -> None:
+        """Release the MongoDB client (the pymongo and boto3 clients are shared and stay open)."""
+        if self.mongo_client:
+            self.mongo_client.close()
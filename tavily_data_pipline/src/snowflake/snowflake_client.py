@@ -5,15 +5,103 @@ Provides connection management and query execution utilities
 for the Snowflake data warehouse.
 """
 
+import asyncio
+import json
 import os
-from typing import Dict, Any, List, Optional
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Any, Iterator, List, Optional, Tuple
 import snowflake.connector
 from snowflake.connector import DictCursor
+from snowflake.connector.errors import NotSupportedError, ProgrammingError
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+
+# run_id filter bound to one JSON-array parameter: the statement text is the
+# same for any number of ids, and Snowflake can hash-join against the ids
+# instead of evaluating a long IN (%s, %s, ...) list.
+_RUN_IDS_IN = "run_id IN (SELECT value::VARCHAR FROM TABLE(FLATTEN(input => PARSE_JSON(%s))))"
+
+
+class _ConnectionPool:
+    """
+    Idle Snowflake connections for one account/user/warehouse/database/schema.
+
+    Each query checks a connection out and returns it afterwards, so a login
+    (TLS handshake plus authentication) is only paid when no idle connection
+    is available, and concurrent queries run on separate sessions. At most
+    `size` idle connections are kept; extra ones are closed on return.
+    """
+
+    def __init__(self, size: int):
+        # LIFO: reuse the most recently used (warmest) session first
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue(maxsize=size)
+
+    def get(self, connect: Callable[[], Any]) -> Any:
+        """Return an idle open connection, or a new one from connect()."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return connect()
+            if not conn.is_closed():
+                return conn
+
+    def put(self, conn: Any) -> None:
+        """Return a connection for reuse (closed ones are dropped)."""
+        if conn.is_closed():
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def clear(self) -> None:
+        """Close every idle connection."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# A plain (optionally database./schema.-qualified) name, safe to put in SQL text
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_$]*(\.[A-Za-z_][A-Za-z0-9_$]*){0,2}")
+
+# Max results kept by a client's query cache (see cache_ttl)
+_CACHE_MAX_ENTRIES = 256
+
+# Session/token-expired errors arrive as ProgrammingError but leave the
+# connection unusable
+_EXPIRED_ERRNOS = {390112, 390114}
+
+_pools: Dict[Tuple[Optional[str], ...], _ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(key: Tuple[Optional[str], ...], size: int) -> _ConnectionPool:
+    """Return the process-wide pool for these connection settings (created on first use)."""
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = _ConnectionPool(size)
+        return pool
 
 
 class SnowflakeClient:
     """
     Snowflake client for agent metadata (3-table model: agent_runs, run_steps, api_calls).
+
+    Connections come from a process-wide pool shared by every client with the
+    same account/user/warehouse/database/schema, so clients are cheap to
+    create and one client can be used from several threads at once.
     """
     
     def __init__(
@@ -23,7 +111,11 @@ class SnowflakeClient:
         password: Optional[str] = None,
         warehouse: Optional[str] = None,
         database: Optional[str] = None,
-        schema: Optional[str] = None
+        schema: Optional[str] = None,
+        login_timeout: int = 10,
+        pool_size: Optional[int] = None,
+        cache_ttl: Optional[float] = None,
+        runs_source: Optional[str] = None
     ):
         """
         Initialize Snowflake client.
@@ -35,6 +127,15 @@ class SnowflakeClient:
             warehouse: Warehouse name. Reads from SNOWFLAKE_WAREHOUSE env if None.
             database: Database name. Reads from SNOWFLAKE_DATABASE env if None.
             schema: Schema name. Reads from SNOWFLAKE_SCHEMA env if None.
+            login_timeout: Seconds to wait for login before failing.
+            pool_size: Max idle connections kept for reuse. Reads from
+                SNOWFLAKE_POOL_SIZE env if None (default 25).
+            cache_ttl: Seconds the get_* query results are reused for identical
+                (query, params). Reads from SNOWFLAKE_CACHE_TTL env if None
+                (default 0, off). Cached results are shared: don't mutate them.
+            runs_source: Table or view the recent-runs queries read. Reads from
+                SNOWFLAKE_RUNS_SOURCE env if None (default agent_runs); e.g. the
+                agent_runs_recent_mv materialized view from snowpipe_setup.sql.
         """
         self.account = account or os.getenv("SNOWFLAKE_ACCOUNT")
         self.user = user or os.getenv("SNOWFLAKE_USER")
@@ -42,24 +143,82 @@ class SnowflakeClient:
         self.warehouse = warehouse or os.getenv("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH")
         self.database = database or os.getenv("SNOWFLAKE_DATABASE", "AGENT_METADATA_DB")
         self.schema = schema or os.getenv("SNOWFLAKE_SCHEMA", "PUBLIC")
+        self.login_timeout = login_timeout
+        self.pool_size = pool_size or int(os.getenv("SNOWFLAKE_POOL_SIZE", "25"))
+        self.cache_ttl = cache_ttl if cache_ttl is not None else float(os.getenv("SNOWFLAKE_CACHE_TTL", "0"))
+        # (query, params, as_frame) -> (expires_at, result), least recently used first
+        self._cache: "OrderedDict[Tuple[str, tuple, bool], Tuple[float, Any]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.runs_source = runs_source or os.getenv("SNOWFLAKE_RUNS_SOURCE", "agent_runs")
+        if not _IDENTIFIER.fullmatch(self.runs_source):
+            raise ValueError(f"Invalid SNOWFLAKE_RUNS_SOURCE {self.runs_source!r}")
 
-        if not all([self.account, self.user, self.password]):
+        if not (self.account and self.user and self.password):
             raise ValueError(
                 "SNOWFLAKE_ACCOUNT, SNOWFLAKE_USER, SNOWFLAKE_PASSWORD must be set"
             )
         
-        self.conn = None
+        self._pool = _get_pool(
+            (self.account, self.user, self.warehouse, self.database, self.schema), self.pool_size
+        )
     
     def connect(self):
-        """Establish connection to Snowflake."""
-        self.conn = snowflake.connector.connect(
+        """Make sure a pooled connection exists, logging in now if none is idle."""
+        self._pool.put(self._pool.get(self._new_connection))
+
+    def _new_connection(self) -> Any:
+        """
+        Log in to Snowflake with this client's settings.
+
+        Result download is tuned through session parameters:
+        CLIENT_PREFETCH_THREADS (SNOWFLAKE_PREFETCH_THREADS, default 8) threads
+        fetch result chunks in parallel for large results, and
+        CLIENT_RESULT_CHUNK_SIZE (SNOWFLAKE_RESULT_CHUNK_MB, default 48, the
+        minimum) keeps chunks small so the first rows of the dashboard's
+        modest results arrive sooner.
+
+        Pooled connections can sit idle for hours, so the session keep-alive
+        heartbeat is on; otherwise Snowflake expires the session (4 h idle)
+        and the next query pays a full login.
+        """
+        return snowflake.connector.connect(
             account=self.account,
             user=self.user,
             password=self.password,
             warehouse=self.warehouse,
             database=self.database,
-            schema=self.schema
+            schema=self.schema,
+            login_timeout=self.login_timeout,
+            client_session_keep_alive=True,
+            client_session_keep_alive_heartbeat_frequency=3600,
+            session_parameters={
+                "CLIENT_PREFETCH_THREADS": int(os.getenv("SNOWFLAKE_PREFETCH_THREADS", "8")),
+                "CLIENT_RESULT_CHUNK_SIZE": int(os.getenv("SNOWFLAKE_RESULT_CHUNK_MB", "48")),
+            },
         )
+
+    @contextmanager
+    def _connection(self) -> Iterator[Any]:
+        """Check a connection out of the pool for one statement."""
+        conn = self._pool.get(self._new_connection)
+        try:
+            yield conn
+        except GeneratorExit:
+            # A caller stopped iterating a result early (iter_batches)
+            self._pool.put(conn)
+            raise
+        except ProgrammingError as e:
+            # SQL error: the session itself is still good (unless it expired)
+            if e.errno in _EXPIRED_ERRNOS:
+                conn.close()
+            else:
+                self._pool.put(conn)
+            raise
+        except BaseException:
+            # Network/auth failure or interruption: don't hand the session out again
+            conn.close()
+            raise
+        self._pool.put(conn)
     
     def execute(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
         """
@@ -72,16 +231,162 @@ class SnowflakeClient:
         Returns:
             List of row dictionaries
         """
-        if self.conn is None:
-            self.connect()
-        
-        cursor = self.conn.cursor(DictCursor)
-        try:
-            cursor.execute(query, params or ())
-            return cursor.fetchall()
-        finally:
-            cursor.close()
+        with self._connection() as conn:
+            cursor = conn.cursor(DictCursor)
+            try:
+                cursor.execute(query, params or ())
+                return cursor.fetchall()
+            finally:
+                cursor.close()
     
+    def execute_rows(
+        self, query: str, params: Optional[tuple] = None
+    ) -> Tuple[List[str], List[tuple]]:
+        """
+        Execute a query and return (column names, row tuples).
+
+        Uses a plain cursor, so no dict is built per row; zip the names in
+        only where a row is actually needed as a mapping.
+
+        Args:
+            query: SQL query string
+            params: Optional query parameters
+
+        Returns:
+            (Snowflake's upper-case column names, list of row tuples)
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params or ())
+                rows = cursor.fetchall()
+                return [col[0] for col in cursor.description], rows
+            finally:
+                cursor.close()
+
+    def execute_pandas(self, query: str, params: Optional[tuple] = None) -> "pd.DataFrame":
+        """
+        Execute a query and return results as a pandas DataFrame.
+
+        Uses the connector's Arrow result batches (fetch_pandas_all), so no
+        per-row Python dicts are built; requires snowflake-connector-python[pandas].
+        Results Snowflake does not return as Arrow (e.g. SHOW) fall back to rows.
+
+        Args:
+            query: SQL query string
+            params: Optional query parameters
+
+        Returns:
+            DataFrame with Snowflake's (upper-case) column names
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params or ())
+                try:
+                    return cursor.fetch_pandas_all()
+                except NotSupportedError:
+                    import pandas as pd
+                    columns = [col[0] for col in cursor.description]
+                    return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+            finally:
+                cursor.close()
+
+    def execute_arrow(self, query: str, params: Optional[tuple] = None) -> "pa.Table":
+        """
+        Execute a query and return results as a pyarrow Table.
+
+        Result batches are decoded column-wise in C++ (fetch_arrow_all), with
+        no per-cell Python objects; use table.to_pylist() where row dicts are
+        needed. Results Snowflake does not return as Arrow fall back to rows.
+
+        Args:
+            query: SQL query string
+            params: Optional query parameters
+
+        Returns:
+            Table with Snowflake's (upper-case) column names (empty, with the
+            result's columns, if no rows matched)
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params or ())
+                try:
+                    return cursor.fetch_arrow_all(force_return_table=True)
+                except NotSupportedError:
+                    import pyarrow as pa
+                    columns = [col[0] for col in cursor.description]
+                    rows = cursor.fetchall()
+                    return pa.table({c: [row[i] for row in rows] for i, c in enumerate(columns)})
+            finally:
+                cursor.close()
+
+    def iter_batches(
+        self, query: str, params: Optional[tuple] = None, size: int = 1000
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Execute a query and yield its rows (dicts) in batches of up to `size`.
+
+        A background thread fetches the next batch (fetchmany) while the caller
+        processes the current one, with at most one batch waiting in between,
+        so network round-trips overlap the caller's work.
+
+        Args:
+            query: SQL query string
+            params: Optional query parameters
+            size: Rows per batch (also the cursor's arraysize)
+
+        Yields:
+            Lists of row dictionaries
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor(DictCursor)
+            cursor.arraysize = size
+            q: "queue.Queue[Any]" = queue.Queue(maxsize=1)
+            stop = threading.Event()
+            done = object()
+
+            def put(item: Any) -> bool:
+                # Gives up once the consumer has stopped, so the thread can exit
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        return True
+                    except queue.Full:
+                        continue
+                return False
+
+            def produce() -> None:
+                try:
+                    cursor.execute(query, params or ())
+                    while True:
+                        rows = cursor.fetchmany(size)
+                        if not rows:
+                            break
+                        if not put(rows):
+                            return
+                except Exception as e:
+                    put(e)
+                    return
+                put(done)
+
+            worker = threading.Thread(target=produce, name="snowflake-fetch", daemon=True)
+            worker.start()
+            try:
+                while True:
+                    item = q.get()
+                    if item is done:
+                        return
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                stop.set()
+                # The connection goes back to the pool only once the thread is off it
+                worker.join()
+                cursor.close()
+
     def execute_ddl(self, ddl: str) -> None:
         """
         Execute DDL statement (CREATE, ALTER, etc.).
@@ -89,87 +394,538 @@ class SnowflakeClient:
         Args:
             ddl: DDL SQL statement
         """
-        if self.conn is None:
-            self.connect()
-        
-        cursor = self.conn.cursor()
-        try:
-            cursor.execute(ddl)
-        finally:
-            cursor.close()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(ddl)
+            finally:
+                cursor.close()
 
-    def get_agent_runs(
+    def execute_script(self, script: str) -> None:
+        """
+        Execute a multi-statement SQL script (e.g. scripts/snowpipe_setup.sql).
+
+        All statements are sent in one request (MULTI_STATEMENT_COUNT = 0)
+        instead of one round-trip each; the first failing statement raises.
+
+        Args:
+            script: SQL statements separated by semicolons
+        """
+        self._execute_multi(script, 0)
+
+    def execute_ddl_multi(self, ddls: List[str]) -> None:
+        """
+        Execute several DDL statements in one request, in order.
+
+        Like execute_script, but for statements built in code; the statement
+        count is passed to Snowflake, so a statement containing a stray
+        semicolon fails instead of silently running as two.
+
+        Args:
+            ddls: DDL statements (without trailing semicolons)
+        """
+        if ddls:
+            self._execute_multi(";\n".join(ddls), len(ddls))
+
+    def _execute_multi(self, sql: str, num_statements: int) -> None:
+        """Run a multi-statement request and step through every result."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, num_statements=num_statements)
+                while cursor.nextset():
+                    pass
+            finally:
+                cursor.close()
+
+    def _run(self, query: str, params: tuple, as_frame: bool, cache: bool = True) -> Any:
+        """
+        Run a query as a DataFrame (execute_pandas) if as_frame, else as row
+        dicts built from the Arrow result (execute_arrow) rather than DictCursor.
+
+        With cache_ttl set (and cache=True), a result is reused for identical
+        (query, params, as_frame) until it expires, saving the round-trip.
+        """
+        if not cache or self.cache_ttl <= 0:
+            return self._fetch(query, params, as_frame)
+        key = (query, params, as_frame)
+        now = time.monotonic()
+        with self._cache_lock:
+            hit = self._cache.get(key)
+            if hit is not None and hit[0] > now:
+                self._cache.move_to_end(key)
+                return hit[1]
+        result = self._fetch(query, params, as_frame)
+        with self._cache_lock:
+            self._cache[key] = (now + self.cache_ttl, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > _CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+        return result
+
+    def _fetch(self, query: str, params: tuple, as_frame: bool) -> Any:
+        if as_frame:
+            return self.execute_pandas(query, params)
+        return self.execute_arrow(query, params).to_pylist()
+
+    def clear_cache(self) -> None:
+        """Drop every cached query result."""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _recent_runs(
         self,
-        limit: int = 500,
+        limit: int,
         date_from: Optional[str] = None,
         date_to: Optional[str] = None,
-    ) -> List[Dict[str, Any]]:
+        columns: str = "*",
+    ) -> Tuple[str, List[Any]]:
         """
-        Get agent_runs with optional date filter on started_at.
-        Uses connection's database/schema (from SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA).
-        """
-        query = """
-            SELECT run_id, company_name, industry, status, started_at, completed_at,
-                   total_latency_ms, total_api_calls, error_message, ingested_at
-            FROM agent_runs
-            WHERE 1=1
+        SQL (and params) selecting the most recent `limit` agent_runs (read
+        from runs_source), with an optional date filter on started_at. Shared
+        by get_agent_runs and the aggregate queries so they all cover the same runs.
         """
+        clauses: List[str] = []
         params: List[Any] = []
+        # Compare started_at itself (not CAST(started_at AS DATE)) so Snowflake
+        # can prune micro-partitions on it; date_to stays inclusive.
         if date_from:
-            query += " AND CAST(started_at AS DATE) >= %s"
+            clauses.append("started_at >= TO_DATE(%s)")
             params.append(date_from)
         if date_to:
-            query += " AND CAST(started_at AS DATE) <= %s"
+            clauses.append("started_at < DATEADD(day, 1, TO_DATE(%s))")
             params.append(date_to)
-        query += " ORDER BY started_at DESC LIMIT %s"
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
         params.append(limit)
-        return self.execute(query, tuple(params))
+        query = f"SELECT {columns} FROM {self.runs_source}{where} ORDER BY started_at DESC LIMIT %s"
+        return query, params
+
+    def get_agent_runs(
+        self,
+        limit: int = 500,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        as_frame: bool = False,
+    ) -> Any:
+        """
+        Get agent_runs with optional date filter on started_at.
+        Uses connection's database/schema (from SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA).
+        Returns a list of row dicts, or a DataFrame (via execute_pandas) if as_frame.
+        """
+        query, params = self._recent_runs(
+            limit, date_from, date_to,
+            columns="run_id, company_name, industry, status, started_at, completed_at, "
+                    "total_latency_ms, total_api_calls, error_message, ingested_at",
+        )
+        return self._run(query, tuple(params), as_frame)
 
-    def get_run_steps(self, limit: int = 5000, run_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
-        """Get run_steps, optionally filtered by run_id list."""
+    def get_run_summary(
+        self,
+        limit: int = 500,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        as_frame: bool = False,
+    ) -> Any:
+        """
+        One row of dashboard counters over the same runs get_agent_runs returns:
+        RUNS, SUCCESSES, FAILURES, TOTAL_API_CALLS, AVG_API_CALLS.
+        """
+        recent, params = self._recent_runs(limit, date_from, date_to, columns="status, total_api_calls")
+        query = f"""
+            SELECT COUNT(*) AS runs,
+                   COUNT_IF(status = 'success') AS successes,
+                   COUNT_IF(status = 'failure') AS failures,
+                   COALESCE(SUM(total_api_calls), 0) AS total_api_calls,
+                   AVG(total_api_calls) AS avg_api_calls
+            FROM ({recent})
+        """
+        return self._run(query, tuple(params), as_frame)
+
+    def get_hourly_run_counts(
+        self,
+        limit: int = 500,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        as_frame: bool = False,
+    ) -> Any:
+        """Runs per hour (HOUR, RUNS) over the same runs get_agent_runs returns."""
+        recent, params = self._recent_runs(limit, date_from, date_to, columns="started_at")
+        query = f"""
+            SELECT DATE_TRUNC('hour', started_at) AS hour, COUNT(*) AS runs
+            FROM ({recent})
+            GROUP BY 1
+            ORDER BY 1
+        """
+        return self._run(query, tuple(params), as_frame)
+
+    def get_company_stats(
+        self,
+        limit: int = 500,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        as_frame: bool = False,
+        top_n: Optional[int] = None,
+    ) -> Any:
+        """
+        Per company: RUNS, FAILURES, AVG_LATENCY_MS over the same runs get_agent_runs returns.
+
+        With top_n, only companies ranked in the top_n by runs, by failures or
+        by avg latency are returned (at most 3 * top_n rows), so top-N charts
+        don't transfer every company.
+        """
+        recent, params = self._recent_runs(
+            limit, date_from, date_to, columns="company_name, status, total_latency_ms"
+        )
+        query = f"""
+            SELECT company_name,
+                   COUNT(*) AS runs,
+                   COUNT_IF(status = 'failure') AS failures,
+                   AVG(total_latency_ms) AS avg_latency_ms
+            FROM ({recent})
+            GROUP BY company_name
+        """
+        if top_n is not None:
+            query += """
+            QUALIFY ROW_NUMBER() OVER (ORDER BY runs DESC) <= %s
+                 OR ROW_NUMBER() OVER (ORDER BY failures DESC) <= %s
+                 OR ROW_NUMBER() OVER (ORDER BY avg_latency_ms DESC NULLS LAST) <= %s
+            """
+            params += [top_n] * 3
+        return self._run(query, tuple(params), as_frame)
+
+    def get_industry_counts(
+        self,
+        limit: int = 500,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        as_frame: bool = False,
+    ) -> Any:
+        """Runs per non-null industry (INDUSTRY, RUNS) over the same runs get_agent_runs returns."""
+        recent, params = self._recent_runs(limit, date_from, date_to, columns="industry")
+        query = f"""
+            SELECT industry, COUNT(*) AS runs
+            FROM ({recent})
+            WHERE industry IS NOT NULL
+            GROUP BY industry
+        """
+        return self._run(query, tuple(params), as_frame)
+
+    def get_step_stats(
+        self,
+        limit: int = 500,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        as_frame: bool = False,
+    ) -> Any:
+        """Per step name: FAILURES and AVG_LATENCY_MS for the steps of the same runs get_agent_runs returns."""
+        recent, params = self._recent_runs(limit, date_from, date_to, columns="run_id")
+        query = f"""
+            SELECT s.step_name,
+                   COUNT_IF(s.status = 'failure') AS failures,
+                   AVG(s.latency_ms) AS avg_latency_ms
+            FROM run_steps s
+            JOIN ({recent}) r ON r.run_id = s.run_id
+            GROUP BY s.step_name
+        """
+        return self._run(query, tuple(params), as_frame)
+
+    @staticmethod
+    def _run_steps_query(limit: int, run_ids: Optional[List[str]]) -> Tuple[str, tuple]:
+        """SQL (and params) for get_run_steps / iter_run_steps."""
         if run_ids:
-            placeholders = ",".join(["%s"] * len(run_ids))
             query = f"""
                 SELECT step_id, run_id, step_name, status, latency_ms, error_message, ingested_at
                 FROM run_steps
-                WHERE run_id IN ({placeholders})
+                WHERE {_RUN_IDS_IN}
                 ORDER BY ingested_at DESC
                 LIMIT %s
             """
-            return self.execute(query, (*run_ids, limit))
+            return query, (json.dumps(run_ids), limit)
         query = """
             SELECT step_id, run_id, step_name, status, latency_ms, error_message, ingested_at
             FROM run_steps
             ORDER BY ingested_at DESC
             LIMIT %s
         """
-        return self.execute(query, (limit,))
+        return query, (limit,)
 
-    def get_api_calls(self, limit: int = 5000, run_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
-        """Get api_calls, optionally filtered by run_id list."""
+    @staticmethod
+    def _api_calls_query(limit: int, run_ids: Optional[List[str]]) -> Tuple[str, tuple]:
+        """SQL (and params) for get_api_calls / iter_api_calls."""
         if run_ids:
-            placeholders = ",".join(["%s"] * len(run_ids))
             query = f"""
                 SELECT call_id, run_id, query_used, results_returned, latency_ms, called_at, ingested_at
                 FROM api_calls
-                WHERE run_id IN ({placeholders})
+                WHERE {_RUN_IDS_IN}
                 ORDER BY called_at DESC
                 LIMIT %s
             """
-            return self.execute(query, (*run_ids, limit))
+            return query, (json.dumps(run_ids), limit)
         query = """
             SELECT call_id, run_id, query_used, results_returned, latency_ms, called_at, ingested_at
             FROM api_calls
             ORDER BY called_at DESC
             LIMIT %s
         """
-        return self.execute(query, (limit,))
+        return query, (limit,)
+
+    def get_run_steps(
+        self, limit: int = 5000, run_ids: Optional[List[str]] = None, as_frame: bool = False
+    ) -> Any:
+        """Get run_steps, optionally filtered by run_id list (row dicts, or a DataFrame if as_frame)."""
+        return self._run(*self._run_steps_query(limit, run_ids), as_frame)
+
+    def iter_run_steps(
+        self, limit: int = 5000, run_ids: Optional[List[str]] = None, size: int = 1000
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Like get_run_steps, but yields batches of row dicts as they arrive (iter_batches)."""
+        return self.iter_batches(*self._run_steps_query(limit, run_ids), size=size)
+
+    def get_top_k_steps_per_run(
+        self, run_ids: List[str], k: int = 10, as_frame: bool = False
+    ) -> Any:
+        """
+        The k most recently ingested run_steps of each given run.
+
+        QUALIFY ROW_NUMBER() per run keeps only k rows per run during the scan
+        instead of sorting every matched step for a global ORDER BY ... LIMIT.
+
+        Args:
+            run_ids: Runs to fetch steps for
+            k: Max steps per run
+            as_frame: Return a DataFrame (via execute_pandas) instead of row dicts
+
+        Returns:
+            Rows shaped like get_run_steps
+        """
+        if not run_ids and not as_frame:
+            return []
+        query = f"""
+            SELECT step_id, run_id, step_name, status, latency_ms, error_message, ingested_at
+            FROM run_steps
+            WHERE {_RUN_IDS_IN}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY run_id ORDER BY ingested_at DESC) <= %s
+        """
+        return self._run(query, (json.dumps(run_ids), k), as_frame)
+
+    def get_api_calls(
+        self, limit: int = 5000, run_ids: Optional[List[str]] = None, as_frame: bool = False
+    ) -> Any:
+        """Get api_calls, optionally filtered by run_id list (row dicts, or a DataFrame if as_frame)."""
+        return self._run(*self._api_calls_query(limit, run_ids), as_frame)
+
+    def iter_api_calls(
+        self, limit: int = 5000, run_ids: Optional[List[str]] = None, size: int = 1000
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Like get_api_calls, but yields batches of row dicts as they arrive (iter_batches)."""
+        return self.iter_batches(*self._api_calls_query(limit, run_ids), size=size)
+
+    def get_steps_and_calls(
+        self, run_ids: List[str], limit: int = 5000, as_frame: bool = False
+    ) -> Tuple[Any, Any]:
+        """
+        Get run_steps and api_calls for the given runs in one statement.
+
+        Both tables are read through a single UNION ALL (tagged by a KIND
+        column) instead of two round-trips, then split back into rows shaped
+        like get_run_steps / get_api_calls.
+
+        Args:
+            run_ids: Runs to fetch children for
+            limit: Max rows per table
+            as_frame: Return DataFrames (via execute_pandas) instead of row dicts
+
+        Returns:
+            (steps, calls)
+        """
+        if not run_ids and not as_frame:
+            return [], []
+        query = f"""
+            SELECT * FROM (
+                SELECT 'step' AS kind, step_id AS id, run_id, step_name, status, error_message,
+                       NULL AS query_used, NULL AS results_returned, latency_ms,
+                       NULL AS called_at, ingested_at
+                FROM run_steps
+                WHERE {_RUN_IDS_IN}
+                ORDER BY ingested_at DESC
+                LIMIT %s
+            )
+            UNION ALL
+            SELECT * FROM (
+                SELECT 'call' AS kind, call_id AS id, run_id, NULL, NULL, NULL,
+                       query_used, results_returned, latency_ms,
+                       called_at, ingested_at
+                FROM api_calls
+                WHERE {_RUN_IDS_IN}
+                ORDER BY called_at DESC
+                LIMIT %s
+            )
+        """
+        ids = json.dumps(run_ids)
+        step_cols = ("RUN_ID", "STEP_NAME", "STATUS", "LATENCY_MS", "ERROR_MESSAGE", "INGESTED_AT")
+        call_cols = ("RUN_ID", "QUERY_USED", "RESULTS_RETURNED", "LATENCY_MS", "CALLED_AT", "INGESTED_AT")
+        if as_frame:
+            df = self.execute_pandas(query, (ids, limit, ids, limit))
+            is_step = (df["KIND"] == "step").to_numpy()
+            steps_df = df.loc[is_step, ["ID", *step_cols]].rename(columns={"ID": "STEP_ID"})
+            calls_df = df.loc[~is_step, ["ID", *call_cols]].rename(columns={"ID": "CALL_ID"})
+            return steps_df.reset_index(drop=True), calls_df.reset_index(drop=True)
+        rows = self.execute_arrow(query, (ids, limit, ids, limit)).to_pylist()
+        steps: List[Dict[str, Any]] = []
+        calls: List[Dict[str, Any]] = []
+        for row in rows:
+            if row["KIND"] == "step":
+                steps.append({"STEP_ID": row["ID"], **{c: row[c] for c in step_cols}})
+            else:
+                calls.append({"CALL_ID": row["ID"], **{c: row[c] for c in call_cols}})
+        return steps, calls
+
+    def get_run_bundle(
+        self,
+        limit: int = 500,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        child_limit: int = 5000,
+        as_frame: bool = False,
+    ) -> Tuple[Any, Any, Any]:
+        """
+        Fetch the recent runs and their steps and API calls in one statement.
+
+        A `runs` CTE (the get_agent_runs window) feeds a UNION ALL of the runs
+        and their run_steps / api_calls, tagged by a KIND column; the rows are
+        split client-side into the shapes get_agent_runs, get_run_steps and
+        get_api_calls return. One round-trip, and agent_runs is scanned once.
+
+        Args:
+            limit: Max runs (same window as get_agent_runs)
+            date_from: Optional start date (inclusive) on started_at
+            date_to: Optional end date (inclusive) on started_at
+            child_limit: Max rows per child table
+            as_frame: Return DataFrames (via execute_pandas) instead of row dicts
+
+        Returns:
+            (runs, steps, calls)
+        """
+        recent, params = self._recent_runs(
+            limit, date_from, date_to,
+            columns="run_id, company_name, industry, status, started_at, completed_at, "
+                    "total_latency_ms, total_api_calls, error_message, ingested_at",
+        )
+        query = f"""
+            WITH runs AS ({recent})
+            SELECT 'run' AS kind, ROW_NUMBER() OVER (ORDER BY started_at DESC) AS seq,
+                   run_id, NULL AS id, company_name, industry, status, started_at, completed_at,
+                   total_latency_ms, total_api_calls, error_message,
+                   NULL AS step_name, NULL AS latency_ms, NULL AS query_used,
+                   NULL AS results_returned, NULL AS called_at, ingested_at
+            FROM runs
+            UNION ALL
+            SELECT * FROM (
+                SELECT 'step', ROW_NUMBER() OVER (ORDER BY ingested_at DESC),
+                       run_id, step_id, NULL, NULL, status, NULL, NULL, NULL, NULL, error_message,
+                       step_name, latency_ms, NULL, NULL, NULL, ingested_at
+                FROM run_steps
+                WHERE run_id IN (SELECT run_id FROM runs)
+                ORDER BY ingested_at DESC
+                LIMIT %s
+            )
+            UNION ALL
+            SELECT * FROM (
+                SELECT 'call', ROW_NUMBER() OVER (ORDER BY called_at DESC),
+                       run_id, call_id, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL,
+                       NULL, latency_ms, query_used, results_returned, called_at, ingested_at
+                FROM api_calls
+                WHERE run_id IN (SELECT run_id FROM runs)
+                ORDER BY called_at DESC
+                LIMIT %s
+            )
+            ORDER BY kind, seq
+        """
+        params += [child_limit, child_limit]
+        run_cols = ("RUN_ID", "COMPANY_NAME", "INDUSTRY", "STATUS", "STARTED_AT", "COMPLETED_AT",
+                    "TOTAL_LATENCY_MS", "TOTAL_API_CALLS", "ERROR_MESSAGE", "INGESTED_AT")
+        step_cols = ("RUN_ID", "STEP_NAME", "STATUS", "LATENCY_MS", "ERROR_MESSAGE", "INGESTED_AT")
+        call_cols = ("RUN_ID", "QUERY_USED", "RESULTS_RETURNED", "LATENCY_MS", "CALLED_AT", "INGESTED_AT")
+        if as_frame:
+            df = self.execute_pandas(query, tuple(params))
+            kind = df["KIND"].to_numpy()
+            runs_df = df.loc[kind == "run", list(run_cols)]
+            steps_df = df.loc[kind == "step", ["ID", *step_cols]].rename(columns={"ID": "STEP_ID"})
+            calls_df = df.loc[kind == "call", ["ID", *call_cols]].rename(columns={"ID": "CALL_ID"})
+            return (
+                runs_df.reset_index(drop=True),
+                steps_df.reset_index(drop=True),
+                calls_df.reset_index(drop=True),
+            )
+        runs: List[Dict[str, Any]] = []
+        steps: List[Dict[str, Any]] = []
+        calls: List[Dict[str, Any]] = []
+        for row in self.execute_arrow(query, tuple(params)).to_pylist():
+            if row["KIND"] == "run":
+                runs.append({c: row[c] for c in run_cols})
+            elif row["KIND"] == "step":
+                steps.append({"STEP_ID": row["ID"], **{c: row[c] for c in step_cols}})
+            else:
+                calls.append({"CALL_ID": row["ID"], **{c: row[c] for c in call_cols}})
+        return runs, steps, calls
+
+    async def get_run_bundle_async(
+        self,
+        limit: int = 500,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        child_limit: int = 5000,
+        as_frame: bool = False,
+    ) -> Tuple[Any, Any, Any]:
+        """
+        Fetch the recent runs and their steps and API calls concurrently.
+
+        The steps and calls queries select their run_ids from the same
+        recent-runs subquery server-side instead of waiting for the runs
+        result, so the three statements run at once on separate pooled
+        connections (one round-trip of latency instead of three).
+
+        Args:
+            limit: Max runs (same window as get_agent_runs)
+            date_from: Optional start date (inclusive) on started_at
+            date_to: Optional end date (inclusive) on started_at
+            child_limit: Max rows per child table
+            as_frame: Return DataFrames instead of row dicts
+
+        Returns:
+            (runs, steps, calls)
+        """
+        recent, params = self._recent_runs(limit, date_from, date_to, columns="run_id")
+        steps_query = f"""
+            SELECT step_id, run_id, step_name, status, latency_ms, error_message, ingested_at
+            FROM run_steps
+            WHERE run_id IN (SELECT run_id FROM ({recent}))
+            ORDER BY ingested_at DESC
+            LIMIT %s
+        """
+        calls_query = f"""
+            SELECT call_id, run_id, query_used, results_returned, latency_ms, called_at, ingested_at
+            FROM api_calls
+            WHERE run_id IN (SELECT run_id FROM ({recent}))
+            ORDER BY called_at DESC
+            LIMIT %s
+        """
+        child_params = (*params, child_limit)
+        runs, steps, calls = await asyncio.gather(
+            asyncio.to_thread(self.get_agent_runs, limit, date_from, date_to, as_frame),
+            asyncio.to_thread(self._run, steps_query, child_params, as_frame),
+            asyncio.to_thread(self._run, calls_query, child_params, as_frame),
+        )
+        return runs, steps, calls
 
     def close(self):
-        """Close Snowflake connection."""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        """
+        Log out the idle pooled connections for this client's settings.
+
+        Other clients with the same settings share the pool; they simply log
+        in again on their next query.
+        """
+        self._pool.clear()
     
     def __enter__(self):
         """Context manager entry."""